@@ -0,0 +1,129 @@
+"""无界面的批量分析入口：加载数据文件、生成概览统计并批量回答问题
+
+用法示例：
+    python batch.py sales.csv orders.xlsx -q "各月份销售额趋势" -q "销量最高的产品" -o reports/ -w 4
+"""
+import argparse
+import contextvars
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import perf
+from profiling import ApproximateProfile, DatasetProfile, detect_outliers
+from utils import build_result_table, dataframe_agent, detect_file_type, read_uploaded_file
+
+logger = logging.getLogger(__name__)
+
+
+def load_file(path: str, sheet_name=None) -> pd.DataFrame:
+    """按扩展名读取 Excel/CSV 文件"""
+    with perf.span("ingest"), open(path, "rb") as data:
+        return read_uploaded_file(data, detect_file_type(path), sheet_name)
+
+
+def profile_frame(df: pd.DataFrame, approximate: bool = False) -> dict:
+    """计算概览统计、相关系数和异常值汇总"""
+    with perf.span("profile.approximate" if approximate else "profile.exact"):
+        profile = (ApproximateProfile if approximate else DatasetProfile).from_frame(df)
+    result = {
+        "rows": profile.rows,
+        "columns": len(profile.columns),
+        "numeric_columns": len(profile.numeric_columns),
+        "missing": profile.missing,
+    }
+    if profile.numeric_columns:
+        result["describe"] = profile.describe()
+        if approximate:
+            result["describe_error"] = profile.describe_error()
+        result["correlation"] = profile.correlation()
+        with perf.span("outliers"):
+            result["outliers"] = detect_outliers(df, profile.numeric_columns).summary
+    return result
+
+
+def answer_questions(df: pd.DataFrame, questions: list, executor: ThreadPoolExecutor) -> list:
+    """并行调用 dataframe_agent 回答问题，结果顺序与问题顺序一致"""
+    # 复制上下文，使工作线程中的埋点归入当前会话
+    futures = [executor.submit(contextvars.copy_context().run, dataframe_agent, df, question) for question in questions]
+    return [{"question": question, "result": future.result()} for question, future in zip(questions, futures)]
+
+
+def _frame_to_json(frame: pd.DataFrame) -> dict:
+    # 借助 to_json 将 NaN/时间戳等转换为合法的 JSON 值
+    return json.loads(frame.to_json(orient="split", force_ascii=False))
+
+
+def write_report(report: dict, output_dir: str) -> str:
+    """将单个文件的分析结果写入 output_dir：report.json 汇总，统计表与结果表格另存为 Parquet"""
+    os.makedirs(output_dir, exist_ok=True)
+    summary = {}
+    for key, value in report.items():
+        if isinstance(value, pd.DataFrame):
+            # Parquet 只接受字符串列名，统计表沿用源数据的列名（可能是年份等整数），写入前统一转换
+            value.rename(columns=str, index=str).to_parquet(os.path.join(output_dir, f"{key}.parquet"))
+            summary[key] = _frame_to_json(value)
+        else:
+            summary[key] = value
+    for i, answer in enumerate(report.get("answers", []), start=1):
+        if "table" in answer["result"]:
+            try:
+                build_result_table(answer["result"]["table"]).to_parquet(os.path.join(output_dir, f"answer_{i}.parquet"), index=False)
+            except (KeyError, ValueError) as table_err:
+                answer["table_error"] = str(table_err)
+    path = os.path.join(output_dir, "report.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2, default=lambda value: value.item() if isinstance(value, np.generic) else str(value))
+    return path
+
+
+def run_batch(paths: list, questions: list, output_dir: str, sheet_name=None, approximate: bool = False, workers: int = 4) -> list:
+    """批量分析多个文件，返回各文件报告的路径；单个文件失败时在其报告中记录错误，不影响其余文件"""
+    perf.bind_session("batch")
+    report_paths = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for path in paths:
+            report_dir = os.path.join(output_dir, os.path.splitext(os.path.basename(path))[0])
+            try:
+                df = load_file(path, sheet_name)
+                report = {"source": os.path.abspath(path)}
+                report.update(profile_frame(df, approximate))
+                report["answers"] = answer_questions(df, questions, executor)
+                report_paths.append(write_report(report, report_dir))
+            except Exception as err:
+                logger.exception("分析文件失败: %s", path)
+                report_paths.append(write_report({"source": os.path.abspath(path), "error": f"{type(err).__name__}: {err}"}, report_dir))
+    return report_paths
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="数据分析智能体批量分析工具")
+    parser.add_argument("files", nargs="+", help="待分析的 Excel/CSV 文件")
+    parser.add_argument("-q", "--question", action="append", default=[], help="分析问题，可重复指定")
+    parser.add_argument("--questions-file", help="问题列表文件，每行一个问题")
+    parser.add_argument("--sheet", help="Excel 工作表名称，默认读取第一个工作表")
+    parser.add_argument("-o", "--output", default="reports", help="输出目录")
+    parser.add_argument("-w", "--workers", type=int, default=4, help="并行调用智能体的线程数")
+    parser.add_argument("--approximate", action="store_true", help="使用近似统计模式")
+    parser.add_argument("--metrics", help="将埋点统计以 Prometheus 文本格式写入该文件")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    questions = list(args.question)
+    if args.questions_file:
+        with open(args.questions_file, encoding="utf-8") as f:
+            questions += [line.strip() for line in f if line.strip()]
+
+    for path in run_batch(args.files, questions, args.output, args.sheet, args.approximate, args.workers):
+        print(path)
+    if args.metrics:
+        with open(args.metrics, "w", encoding="utf-8") as f:
+            f.write(perf.export_prometheus())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,460 @@
+import logging
+import uuid
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+import streamlit as st
+
+import perf
+from session_store import data_manager
+from utils import EXPORT_FORMATS, build_result_table, export_table
+from workspace import Workspace
+
+
+def _configure_logging() -> None:
+    # Streamlit 不配置根日志器，为 utils 单独输出 INFO 日志，使大模型调用的 token 用量出现在服务日志中
+    utils_logger = logging.getLogger("utils")
+    if not utils_logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+        utils_logger.addHandler(handler)
+        utils_logger.setLevel(logging.INFO)
+        utils_logger.propagate = False
+
+
+def init_session() -> None:
+    """为当前浏览器会话分配 ID，性能埋点与会话数据都按该 ID 隔离"""
+    _configure_logging()
+    if "perf_session_id" not in st.session_state:
+        st.session_state["perf_session_id"] = uuid.uuid4().hex[:12]
+    perf.bind_session(st.session_state["perf_session_id"])
+    data_manager.start_janitor()
+
+
+def get_workspace() -> Workspace:
+    """当前会话的多数据集工作区"""
+    if "workspace" not in st.session_state:
+        st.session_state["workspace"] = Workspace(st.session_state["perf_session_id"])
+    return st.session_state["workspace"]
+
+
+def get_df() -> "pd.DataFrame":
+    """工作区中当前选中的数据集；闲置时可能已落盘，访问时透明加载"""
+    workspace = get_workspace()
+    return workspace.get(workspace.active)
+
+
+def set_df(df: "pd.DataFrame", delta_id=None) -> None:
+    workspace = get_workspace()
+    workspace.update(workspace.active, df, delta_id)
+
+
+def has_df() -> bool:
+    workspace = get_workspace()
+    return workspace.active is not None and workspace.contains(workspace.active)
+
+
+# 数据点总数超过该阈值时切换为 WebGL 渲染，并隐藏数据标签
+WEBGL_POINT_THRESHOLD = 5000
+
+
+def _coerce_values(values) -> "np.ndarray":
+    """向量化地将一组值转换为浮点数组，无法转换的值按 0 处理"""
+    arr = np.asarray(values)
+    if arr.dtype.kind in "biuf":
+        return arr.astype(float)
+    return pd.to_numeric(pd.Series(values, dtype=object), errors="coerce").fillna(0).to_numpy(dtype=float)
+
+
+def coerce_chart_series(input_data: dict) -> tuple:
+    """解析单系列或多系列图表数据，返回 (系列名称列表, 形状为 系列数×类别数 的数组)
+
+    多系列数据可以是 {"系列名": [...]} 形式的字典，也可以是二维数组配合 "series" 名称列表。
+    """
+    data = input_data["data"]
+    count = len(input_data["columns"])
+    if isinstance(data, dict):
+        names = [str(name) for name in data]
+        rows = list(data.values())
+    elif len(data) and isinstance(data[0], (list, tuple)):
+        rows = data
+        names = [str(name) for name in input_data.get("series", [])][:len(rows)]
+        names += [f"系列{i + 1}" for i in range(len(names), len(rows))]
+    else:
+        rows = [data]
+        names = [None]
+    values = np.zeros((len(rows), count))
+    for i, row in enumerate(rows):
+        row_values = _coerce_values(row)[:count]
+        values[i, :len(row_values)] = row_values
+    return names, values
+
+
+@perf.timed("create_advanced_chart")
+@st.cache_data
+def create_advanced_chart(input_data: dict, chart_type: str, title: str = "数据分析图表", x_label: str = "类别", y_label: str = "数值") -> None:
+    """生成优化的统计图表"""
+    safe_columns = np.asarray(input_data["columns"]).astype(str)
+    series_names, values = coerce_chart_series(input_data)
+    multi_series = len(series_names) > 1
+    # 大数据量时使用 WebGL 轨迹，并去掉逐点文字标签
+    large = values.size > WEBGL_POINT_THRESHOLD
+    scatter_trace = go.Scattergl if large else go.Scatter
+    
+    # 设置自定义颜色方案
+    color_sequence = px.colors.qualitative.Set3
+    series_colors = px.colors.qualitative.Plotly
+    
+    if chart_type == "bar":
+        fig = go.Figure()
+        for i, (name, safe_data) in enumerate(zip(series_names, values)):
+            label_options = {} if large else dict(text=safe_data, texttemplate='%{text:.2f}', textposition='auto')
+            if multi_series:
+                marker = dict(color=series_colors[i % len(series_colors)])
+            else:
+                marker = dict(color=safe_data, colorscale='Viridis', showscale=True)
+            fig.add_trace(
+                go.Bar(
+                    x=safe_columns,
+                    y=safe_data,
+                    name=name,
+                    marker=marker,
+                    hovertemplate='%{x}<br>%{y:.2f}',
+                    **label_options
+                )
+            )
+        
+        fig.update_layout(
+            title=dict(
+                text=str(title),
+                font=dict(size=24)
+            ),
+            xaxis_title=dict(
+                text=str(x_label),
+                font=dict(size=14)
+            ),
+            yaxis_title=dict(
+                text=str(y_label),
+                font=dict(size=14)
+            ),
+            height=500,
+            showlegend=multi_series,
+            barmode='group',
+            margin=dict(t=50, b=50, l=50, r=50),
+            plot_bgcolor='white',
+            paper_bgcolor='white',
+            hoverlabel=dict(bgcolor='white')
+        )
+        
+        fig.update_xaxes(showgrid=True, gridwidth=1, gridcolor='LightGray')
+        fig.update_yaxes(showgrid=True, gridwidth=1, gridcolor='LightGray')
+        
+        st.plotly_chart(fig, use_container_width=True, config={'displayModeBar': True})
+        
+    elif chart_type == "line":
+        fig = go.Figure()
+        
+        # 添加主线
+        for i, (name, safe_data) in enumerate(zip(series_names, values)):
+            color = series_colors[i % len(series_colors)] if multi_series else 'rgb(66, 133, 244)'
+            fig.add_trace(
+                scatter_trace(
+                    x=safe_columns,
+                    y=safe_data,
+                    mode='lines' if large else 'lines+markers',
+                    name=name or '数据趋势',
+                    line=dict(width=2 if multi_series else 3, color=color),
+                    marker=dict(
+                        size=8,
+                        color=color,
+                        symbol='circle'
+                    ),
+                    hovertemplate='%{x}<br>%{y:.2f}'
+                )
+            )
+        
+        # 添加范围区域（仅单系列且数据量较小时绘制，避免重复传输两份数据）
+        if not multi_series and not large:
+            fig.add_trace(
+                go.Scatter(
+                    x=safe_columns,
+                    y=values[0] * 1.1,
+                    mode='lines',
+                    line=dict(width=0),
+                    showlegend=False,
+                    hoverinfo='skip'
+                )
+            )
+            
+            fig.add_trace(
+                go.Scatter(
+                    x=safe_columns,
+                    y=values[0] * 0.9,
+                    mode='lines',
+                    line=dict(width=0),
+                    fillcolor='rgba(66, 133, 244, 0.2)',
+                    fill='tonexty',
+                    showlegend=False,
+                    hoverinfo='skip'
+                )
+            )
+        
+        fig.update_layout(
+            title=dict(
+                text=str(title),
+                font=dict(size=24)
+            ),
+            xaxis_title=dict(
+                text=str(x_label),
+                font=dict(size=14)
+            ),
+            yaxis_title=dict(
+                text=str(y_label),
+                font=dict(size=14)
+            ),
+            height=500,
+            showlegend=True,
+            margin=dict(t=50, b=50, l=50, r=50),
+            plot_bgcolor='white',
+            paper_bgcolor='white',
+            hoverlabel=dict(bgcolor='white'),
+            legend=dict(
+                yanchor="top",
+                y=0.99,
+                xanchor="left",
+                x=0.01
+            )
+        )
+        
+        fig.update_xaxes(showgrid=True, gridwidth=1, gridcolor='LightGray')
+        fig.update_yaxes(showgrid=True, gridwidth=1, gridcolor='LightGray')
+        
+        st.plotly_chart(fig, use_container_width=True, config={'displayModeBar': True})
+        
+    elif chart_type == "pie":
+        # 多系列时按类别汇总
+        safe_data = values.sum(axis=0)
+        
+        fig = go.Figure(data=[
+            go.Pie(
+                labels=safe_columns,
+                values=safe_data,
+                hole=0.4,
+                textinfo='label+percent',
+                textposition='outside',
+                texttemplate='%{label}<br>%{percent:.1%}',
+                marker=dict(colors=color_sequence),
+                hovertemplate='%{label}<br>数值: %{value:.2f}<br>占比: %{percent:.1%}'
+            )
+        ])
+        
+        fig.update_layout(
+            title=dict(
+                text=str(title),
+                font=dict(size=24)
+            ),
+            height=500,
+            showlegend=True,
+            margin=dict(t=50, b=50, l=50, r=50),
+            plot_bgcolor='white',
+            paper_bgcolor='white',
+            hoverlabel=dict(bgcolor='white'),
+            legend=dict(
+                orientation="h",
+                yanchor="bottom",
+                y=1.02,
+                xanchor="right",
+                x=1
+            )
+        )
+        
+        st.plotly_chart(fig, use_container_width=True, config={'displayModeBar': True})
+        
+    elif chart_type == "scatter":
+        positions = np.arange(len(safe_columns))
+        
+        fig = go.Figure()
+        for i, (name, safe_data) in enumerate(zip(series_names, values)):
+            if multi_series:
+                marker = dict(size=6 if large else 12, color=series_colors[i % len(series_colors)])
+            else:
+                # 生成渐变色
+                marker = dict(size=6 if large else 12, color=np.linspace(0, 1, len(safe_data)), colorscale='Viridis', showscale=True)
+            if not large:
+                marker['line'] = dict(width=1, color='white')
+            fig.add_trace(
+                scatter_trace(
+                    x=positions,
+                    y=safe_data,
+                    mode='markers',
+                    name=name,
+                    marker=marker,
+                    text=safe_columns,
+                    hovertemplate='%{text}<br>数值: %{y:.2f}'
+                )
+            )
+        
+        # 数据量较大时不再逐点显示刻度文字
+        xaxis = dict(
+            title=dict(
+                text=str(x_label),
+                font=dict(size=14)
+            )
+        )
+        if not large:
+            xaxis.update(tickvals=positions, ticktext=safe_columns)
+        
+        fig.update_layout(
+            title=dict(
+                text=str(title),
+                font=dict(size=24)
+            ),
+            xaxis=xaxis,
+            yaxis_title=dict(
+                text=str(y_label),
+                font=dict(size=14)
+            ),
+            height=500,
+            showlegend=multi_series,
+            margin=dict(t=50, b=50, l=50, r=50),
+            plot_bgcolor='white',
+            paper_bgcolor='white',
+            hoverlabel=dict(bgcolor='white')
+        )
+        
+        fig.update_xaxes(showgrid=True, gridwidth=1, gridcolor='LightGray')
+        fig.update_yaxes(showgrid=True, gridwidth=1, gridcolor='LightGray')
+        
+        st.plotly_chart(fig, use_container_width=True, config={'displayModeBar': True})
+
+
+def render_paginated_table(df: "pd.DataFrame", key: str, page_sizes: tuple = (100, 500, 1000, 5000)) -> None:
+    """分页展示大表，只把当前页数据发送到前端"""
+    if len(df) <= page_sizes[0]:
+        st.dataframe(df, use_container_width=True)
+        return
+    col1, col2, col3 = st.columns([1, 1, 2])
+    with col1:
+        page_size = st.selectbox("每页行数", page_sizes, key=f"{key}_page_size")
+    page_count = (len(df) - 1) // page_size + 1
+    # 调大每页行数后，原页码可能超出范围
+    if st.session_state.get(f"{key}_page", 1) > page_count:
+        st.session_state[f"{key}_page"] = page_count
+    with col2:
+        page = st.number_input("页码", min_value=1, max_value=page_count, value=1, step=1, key=f"{key}_page")
+    start = (page - 1) * page_size
+    end = min(start + page_size, len(df))
+    with col3:
+        st.caption(f"第 {start + 1:,} - {end:,} 行，共 {len(df):,} 行 / {page_count:,} 页")
+    st.dataframe(df.iloc[start:end], use_container_width=True)
+
+
+def _discard_export(key: str) -> None:
+    # 下载已发出后即释放导出文件，避免会话中长期保留整张表的第二份副本
+    st.session_state.pop(f"{key}_export", None)
+
+
+def render_table_export(df: "pd.DataFrame", key: str) -> None:
+    """点击后才生成导出文件，避免每次渲染都序列化整张表"""
+    col1, col2 = st.columns([1, 1])
+    with col1:
+        fmt = st.selectbox("导出格式", list(EXPORT_FORMATS), key=f"{key}_format", label_visibility="collapsed")
+    with col2:
+        if st.button("📦 生成导出文件", key=f"{key}_export_button", use_container_width=True):
+            try:
+                with perf.span(f"export.{fmt}"):
+                    st.session_state[f"{key}_export"] = (fmt, export_table(df, fmt))
+            except (ImportError, ValueError) as export_err:
+                st.error(f"导出失败: {str(export_err)}")
+    exported = st.session_state.get(f"{key}_export")
+    if exported and exported[0] == fmt:
+        extension, mime = EXPORT_FORMATS[fmt]
+        st.download_button(
+            label="📥 下载表格数据",
+            data=exported[1],
+            file_name=f'analysis_result_{datetime.now().strftime("%Y%m%d_%H%M%S")}.{extension}',
+            mime=mime,
+            on_click=_discard_export,
+            args=(key,)
+        )
+
+
+def clear_result_state(key: str) -> None:
+    """移除 render_result 按 key 保存在会话中的结果表、导出文件和控件状态"""
+    for suffix in ("_df", "_export", "_page", "_format"):
+        st.session_state.pop(f"{key}{suffix}", None)
+
+
+def render_result(result: dict, key: str, title: str = "数据分析图表", x_label: str = "类别", y_label: str = "数值", table_df: "pd.DataFrame" = None) -> None:
+    """展示智能体返回的结果；table_df 为已构建好的结果表，未提供时按 key 缓存在会话中"""
+    # 本次调用的 token 用量与耗时
+    if "usage" in result:
+        usage = result["usage"]
+        st.caption(
+            f"⏱️ 耗时 {usage['seconds']:.2f}s · 提示词 {usage['prompt_tokens']:,} tokens"
+            f"（缓存命中 {usage['cached_tokens']:,}）· 生成 {usage['completion_tokens']:,} tokens"
+        )
+    
+    # 显示调试信息（如果存在）
+    if "debug_info" in result:
+        with st.expander("🔧 调试信息", expanded=False):
+            st.warning(result["debug_info"])
+    
+    if "error" in result:
+        with st.expander("❌ 错误详情", expanded=False):
+            st.error(result["error"])
+    
+    if "answer" in result:
+        st.markdown("### 💡 分析洞察")
+        st.success(result["answer"])
+    
+    if "table" in result:
+        st.markdown("### 📊 数据表格")
+        try:
+            # 表格只构建一次，重跑时直接复用
+            if table_df is None:
+                if f"{key}_df" not in st.session_state:
+                    st.session_state[f"{key}_df"] = build_result_table(result["table"])
+                table_df = st.session_state[f"{key}_df"]
+            render_paginated_table(table_df, key)
+            
+            # 提供下载选项
+            render_table_export(table_df, key)
+        except (KeyError, ValueError) as table_err:
+            st.error(f"表格数据格式错误: {str(table_err)}")
+            st.json(result["table"])  # 显示原始数据结构
+    
+    if "bar" in result:
+        st.markdown("### 📊 柱状图分析")
+        try:
+            create_advanced_chart(result["bar"], "bar", title, x_label, y_label)
+        except Exception as chart_err:
+            st.error(f"柱状图生成错误: {str(chart_err)}")
+            st.json(result["bar"])  # 显示原始数据结构
+    
+    if "line" in result:
+        st.markdown("### 📈 趋势线图")
+        try:
+            create_advanced_chart(result["line"], "line", title, x_label, y_label)
+        except Exception as chart_err:
+            st.error(f"折线图生成错误: {str(chart_err)}")
+            st.json(result["line"])  # 显示原始数据结构
+    
+    if "pie" in result:
+        st.markdown("### 🥧 饼图分析")
+        try:
+            create_advanced_chart(result["pie"], "pie", title, x_label, y_label)
+        except Exception as chart_err:
+            st.error(f"饼图生成错误: {str(chart_err)}")
+            st.json(result["pie"])  # 显示原始数据结构
+    
+    if "scatter" in result:
+        st.markdown("### 🔸 散点图分析")
+        try:
+            create_advanced_chart(result["scatter"], "scatter", title, x_label, y_label)
+        except Exception as chart_err:
+            st.error(f"散点图生成错误: {str(chart_err)}")
+            st.json(result["scatter"])  # 显示原始数据结构
@@ -0,0 +1,222 @@
+import json
+import re
+from collections import deque
+
+import pandas as pd
+
+from utils import build_result_table
+
+CHART_TYPES = ("bar", "line", "pie", "scatter")
+RESULT_KINDS = ("table",) + CHART_TYPES
+# 保留的对话轮次（含每轮的结果表缓存）
+MAX_TURNS = 20
+# 原样发送给模型的最近轮次，更早的轮次只保留一行摘要
+CONTEXT_TURNS = 3
+SUMMARY_LINES = 10
+# 发送给模型的历史结果最多保留的行数/数据点数
+CONTEXT_ROWS = 20
+# 超过该长度的追问视为新问题，不尝试本地处理
+LOCAL_QUERY_MAX_LENGTH = 30
+
+# 追问必须完全由以下改写子句（加上语气词、标点）构成才在本地处理，含有其他内容时交给模型
+YEAR_FILTER = re.compile(r"(?:只看|只要|只显示|仅看|仅显示|筛选出?)\s*((?:19|20)\d{2})\s*年?|\bonly\s+(?:for\s+|in\s+)?((?:19|20)\d{2})\b", re.IGNORECASE)
+TOP_N = re.compile(r"(?:只看|只要|只显示)?前\s*(\d+)\s*(?:项|个|名|条|行|位|$)|\btop\s*(\d+)\b", re.IGNORECASE)
+CHART_SWITCH = re.compile(
+    r"(?:改成|换成|改为|换为|改用|换用|显示为|显示成|画成|用)\s*(折线图|柱状图|条形图|饼图|散点图|表格)"
+    r"|\b(?:show\s+(?:it\s+)?)?as\s+(?:an?\s+)?(?:(line|bar|pie|scatter)\s+chart|(table))\b",
+    re.IGNORECASE,
+)
+# 以这些后缀命名的数值列视为类别（如“年份”“月份”“产品编号”）
+LABEL_SUFFIXES = ("年", "年份", "月", "月份", "季度", "日期", "编号", "代码", "id", "year", "month", "code")
+CHART_NAMES = {"折线图": "line", "柱状图": "bar", "条形图": "bar", "饼图": "pie", "散点图": "scatter", "表格": "table"}
+FILLER = re.compile(r"那么|那|再|请|然后|现在|并且|并|和|的|数据|结果|吧|呢|一下|\b(?:now|then|please|and|just|the|data|it|show)\b|[\s,，。.!！?？;；、]", re.IGNORECASE)
+
+
+def result_kind(result: dict):
+    """结果中的表格/图表类型，纯文字回答返回 None"""
+    return next((kind for kind in RESULT_KINDS if kind in result), None)
+
+
+def result_frame(result: dict):
+    """将表格或图表结果统一转换为 DataFrame，图表的第一列为类别"""
+    kind = result_kind(result)
+    if kind is None:
+        return None
+    if kind == "table":
+        return build_result_table(result["table"])
+    chart = result[kind]
+    data = chart["data"]
+    frame = pd.DataFrame({"类别": [str(col) for col in chart["columns"]]})
+    if isinstance(data, dict):
+        series = data
+    elif len(data) and isinstance(data[0], (list, tuple)):
+        names = list(chart.get("series", []))
+        names += [f"系列{i + 1}" for i in range(len(names), len(data))]
+        series = dict(zip(names, data))
+    else:
+        series = {"数值": data}
+    for name, values in series.items():
+        frame[str(name)] = pd.to_numeric(pd.Series(list(values)[:len(frame)], dtype=object), errors="coerce")
+    return frame
+
+
+def _is_label_column(frame: pd.DataFrame, col) -> bool:
+    """年份、月份、编号等数值列作为类别轴而不是数据系列"""
+    if pd.api.types.is_bool_dtype(frame[col]) or not pd.api.types.is_numeric_dtype(frame[col]):
+        return True
+    if str(col).lower().endswith(LABEL_SUFFIXES):
+        return True
+    values = frame[col].dropna()
+    return pd.api.types.is_integer_dtype(frame[col]) and len(values) > 0 and values.between(1900, 2100).all()
+
+
+def chart_axes(frame: pd.DataFrame) -> tuple:
+    """选出类别轴列（优先时间列、年份等类别型数值列，其次文本列）和作为数据系列的数值列"""
+    labels = [col for col in frame.columns if _is_label_column(frame, col)]
+    dates = [col for col in labels if pd.api.types.is_datetime64_any_dtype(frame[col])]
+    numeric_labels = [col for col in labels if pd.api.types.is_numeric_dtype(frame[col]) and not pd.api.types.is_bool_dtype(frame[col])]
+    label = next(iter(dates + numeric_labels + labels), None)
+    values = [col for col in frame.columns if col not in labels]
+    return label, values
+
+
+def frame_result(frame: pd.DataFrame, kind: str):
+    """将 DataFrame 转换回智能体的结果格式，无法绘制为图表时返回 None"""
+    if kind == "table":
+        split = json.loads(frame.to_json(orient="split", index=False, date_format="iso", force_ascii=False))
+        return {"table": {"columns": [str(col) for col in split["columns"]], "data": split["data"]}}
+    label, numeric = chart_axes(frame)
+    if not numeric:
+        return None
+    if label is None:
+        categories = [str(i) for i in frame.index]
+    elif pd.api.types.is_datetime64_any_dtype(frame[label]):
+        categories = frame[label].dt.strftime("%Y-%m-%d").tolist()
+    else:
+        categories = frame[label].astype(str).tolist()
+    values = [json.loads(frame[col].to_json(orient="values")) for col in numeric]
+    if len(values) == 1:
+        return {kind: {"columns": categories, "data": values[0]}}
+    return {kind: {"columns": categories, "series": [str(col) for col in numeric], "data": values}}
+
+
+def filter_year(frame: pd.DataFrame, year: str) -> pd.DataFrame:
+    """保留任一列包含指定年份的行，时间列按年份比较，整数列按取值比较"""
+    mask = pd.Series(False, index=frame.index)
+    for col in frame.columns:
+        if pd.api.types.is_datetime64_any_dtype(frame[col]):
+            mask |= frame[col].dt.year == int(year)
+        elif pd.api.types.is_integer_dtype(frame[col]):
+            mask |= frame[col] == int(year)
+        elif not pd.api.types.is_numeric_dtype(frame[col]):
+            mask |= frame[col].astype(str).str.contains(year, regex=False)
+    return frame[mask]
+
+
+def top_rows(frame: pd.DataFrame, count: int) -> pd.DataFrame:
+    """按第一个数据列（不含年份、编号等类别型数值列）降序取前 count 行"""
+    _, values = chart_axes(frame)
+    if values:
+        frame = frame.sort_values(values[0], ascending=False)
+    return frame.head(count)
+
+
+def _compact(result: dict) -> dict:
+    """压缩历史结果，只保留前若干行，控制追问时的提示词长度"""
+    compact = {key: value for key, value in result.items() if key != "usage"}
+    kind = result_kind(result)
+    if kind == "table":
+        data = result["table"].get("data", [])
+        compact["table"] = {"columns": result["table"].get("columns", []), "data": data[:CONTEXT_ROWS]}
+        if len(data) > CONTEXT_ROWS:
+            compact["table"]["total_rows"] = len(data)
+    elif kind is not None:
+        chart = result[kind]
+        data = chart.get("data", [])
+        if isinstance(data, dict):
+            data = {name: values[:CONTEXT_ROWS] for name, values in data.items()}
+        elif len(data) and isinstance(data[0], (list, tuple)):
+            data = [values[:CONTEXT_ROWS] for values in data]
+        else:
+            data = data[:CONTEXT_ROWS]
+        compact[kind] = dict(chart, columns=chart.get("columns", [])[:CONTEXT_ROWS], data=data)
+    return compact
+
+
+class Conversation:
+    """多轮对话状态：有上限的历史、较早轮次的摘要以及每轮结果表的缓存"""
+
+    def __init__(self):
+        self.turns = deque(maxlen=MAX_TURNS)
+        self.summary = deque(maxlen=SUMMARY_LINES)
+        self._next_id = 0
+
+    @property
+    def last(self):
+        return self.turns[-1] if self.turns else None
+
+    def add(self, query: str, result: dict, source: str) -> list:
+        """记录一轮对话，source 为 "llm" 或 "local"（本地基于上一轮结果生成）；返回因超出上限被移除的轮次"""
+        # 即将移出上下文窗口的轮次压缩为一行摘要
+        if len(self.turns) >= CONTEXT_TURNS:
+            self.summary.append(self._summarize(self.turns[-CONTEXT_TURNS]))
+        evicted = [self.turns[0]] if len(self.turns) == self.turns.maxlen else []
+        try:
+            table = result_frame(result)
+        except (KeyError, TypeError, ValueError):
+            table = None
+        turn = {"id": self._next_id, "query": query, "result": result, "table": table, "source": source}
+        self._next_id += 1
+        self.turns.append(turn)
+        return evicted
+
+    @staticmethod
+    def _summarize(turn: dict) -> str:
+        result = turn["result"]
+        kind = result_kind(result)
+        if kind is None:
+            answer = str(result.get("answer", ""))[:50]
+        else:
+            shape = f"{len(turn['table'])} 行" if turn["table"] is not None else ""
+            answer = f"{kind} 结果 {shape}".strip()
+        return f"问：{turn['query'][:50]}；答：{answer}"
+
+    def context_messages(self) -> list:
+        """追问时附带的上下文：较早轮次的摘要加最近几轮的问答"""
+        messages = []
+        if self.summary:
+            messages.append({"role": "system", "content": "此前对话摘要：\n" + "\n".join(self.summary)})
+        for turn in list(self.turns)[-CONTEXT_TURNS:]:
+            messages.append({"role": "user", "content": turn["query"]})
+            messages.append({"role": "assistant", "content": json.dumps(_compact(turn["result"]), ensure_ascii=False)})
+        return messages
+
+    def refine_locally(self, query: str):
+        """尝试直接基于上一轮结果处理追问（按年份筛选、取前 N 项、切换图表类型），无法处理时返回 None"""
+        last = self.last
+        if last is None or last["table"] is None or len(query) > LOCAL_QUERY_MAX_LENGTH:
+            return None
+        clauses = {}
+        remainder = query
+        for name, pattern in (("year", YEAR_FILTER), ("top", TOP_N), ("chart", CHART_SWITCH)):
+            matches = list(pattern.finditer(remainder))
+            if len(matches) > 1:
+                return None
+            if matches:
+                clauses[name] = next(group for group in matches[0].groups() if group)
+                remainder = pattern.sub(" ", remainder)
+        # 去掉改写子句和语气词后仍有内容，说明是新的问题
+        if not clauses or FILLER.sub("", remainder):
+            return None
+
+        frame = last["table"]
+        kind = result_kind(last["result"])
+        if "year" in clauses:
+            frame = filter_year(frame, clauses["year"])
+            if frame.empty:
+                return None
+        if "top" in clauses:
+            frame = top_rows(frame, int(clauses["top"]))
+        if "chart" in clauses:
+            kind = CHART_NAMES.get(clauses["chart"], clauses["chart"].lower())
+        return frame_result(frame, kind)
@@ -1,16 +1,19 @@
 import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
 import seaborn as sns
-import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-import openpyxl
 import pandas as pd
 import streamlit as st
 import numpy as np
-from datetime import datetime
+import os
 
-from utils import dataframe_agent
+import perf
+from components import clear_result_state, get_df, get_workspace, has_df, init_session, render_result, render_table_export, set_df
+from session_store import data_manager
+from profiling import ApproximateProfile, DatasetProfile, OutlierReport, detect_outliers
+from utils import UPLOAD_TYPES, dataframe_agent, detect_file_type, list_sheet_names, read_uploaded_file
+from workspace import JOIN_HOW
 
 # 页面性能优化配置
 st.set_page_config(
@@ -20,6 +23,9 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# 性能埋点与会话数据按会话隔离
+init_session()
+
 # 设置页面样式
 st.markdown("""
 <style>
@@ -161,257 +167,24 @@ sns.set_style("whitegrid")
 sns.set_palette("husl")
 
 
-@st.cache_data
-def create_advanced_chart(input_data: dict, chart_type: str, title: str = "数据分析图表", x_label: str = "类别", y_label: str = "数值") -> None:
-    """生成优化的统计图表"""
-    columns = input_data["columns"]
-    data = input_data["data"]
-    
-    # 设置自定义颜色方案
-    color_sequence = px.colors.qualitative.Set3
-    
-    if chart_type == "bar":
-        safe_columns = [str(col) for col in columns]
-        safe_data = [float(val) if isinstance(val, (int, float)) else 0 for val in data]
-        
-        fig = go.Figure(data=[
-            go.Bar(
-                x=safe_columns,
-                y=safe_data,
-                marker=dict(
-                    color=safe_data,
-                    colorscale='Viridis',
-                    showscale=True
-                ),
-                text=safe_data,
-                texttemplate='%{text:.2f}',
-                textposition='auto',
-                hovertemplate='%{x}<br>%{y:.2f}'
-            )
-        ])
-        
-        fig.update_layout(
-            title=dict(
-                text=str(title),
-                font=dict(size=24)
-            ),
-            xaxis_title=dict(
-                text=str(x_label),
-                font=dict(size=14)
-            ),
-            yaxis_title=dict(
-                text=str(y_label),
-                font=dict(size=14)
-            ),
-            height=500,
-            showlegend=False,
-            margin=dict(t=50, b=50, l=50, r=50),
-            plot_bgcolor='white',
-            paper_bgcolor='white',
-            hoverlabel=dict(bgcolor='white')
-        )
-        
-        fig.update_xaxes(showgrid=True, gridwidth=1, gridcolor='LightGray')
-        fig.update_yaxes(showgrid=True, gridwidth=1, gridcolor='LightGray')
-        
-        st.plotly_chart(fig, use_container_width=True, config={'displayModeBar': True})
-        
-    elif chart_type == "line":
-        safe_columns = [str(col) for col in columns]
-        safe_data = [float(val) if isinstance(val, (int, float)) else 0 for val in data]
-        
-        fig = go.Figure()
-        
-        # 添加主线
-        fig.add_trace(
-            go.Scatter(
-                x=safe_columns,
-                y=safe_data,
-                mode='lines+markers',
-                name='数据趋势',
-                line=dict(width=3, color='rgb(66, 133, 244)'),
-                marker=dict(
-                    size=8,
-                    color='rgb(66, 133, 244)',
-                    symbol='circle'
-                ),
-                hovertemplate='%{x}<br>%{y:.2f}'
-            )
-        )
-        
-        # 添加范围区域
-        fig.add_trace(
-            go.Scatter(
-                x=safe_columns,
-                y=[y * 1.1 for y in safe_data],
-                mode='lines',
-                line=dict(width=0),
-                showlegend=False,
-                hoverinfo='skip'
-            )
-        )
-        
-        fig.add_trace(
-            go.Scatter(
-                x=safe_columns,
-                y=[y * 0.9 for y in safe_data],
-                mode='lines',
-                line=dict(width=0),
-                fillcolor='rgba(66, 133, 244, 0.2)',
-                fill='tonexty',
-                showlegend=False,
-                hoverinfo='skip'
-            )
-        )
-        
-        fig.update_layout(
-            title=dict(
-                text=str(title),
-                font=dict(size=24)
-            ),
-            xaxis_title=dict(
-                text=str(x_label),
-                font=dict(size=14)
-            ),
-            yaxis_title=dict(
-                text=str(y_label),
-                font=dict(size=14)
-            ),
-            height=500,
-            showlegend=True,
-            margin=dict(t=50, b=50, l=50, r=50),
-            plot_bgcolor='white',
-            paper_bgcolor='white',
-            hoverlabel=dict(bgcolor='white'),
-            legend=dict(
-                yanchor="top",
-                y=0.99,
-                xanchor="left",
-                x=0.01
-            )
-        )
-        
-        fig.update_xaxes(showgrid=True, gridwidth=1, gridcolor='LightGray')
-        fig.update_yaxes(showgrid=True, gridwidth=1, gridcolor='LightGray')
-        
-        st.plotly_chart(fig, use_container_width=True, config={'displayModeBar': True})
-        
-    elif chart_type == "pie":
-        safe_columns = [str(col) for col in columns]
-        safe_data = [float(val) if isinstance(val, (int, float)) else 0 for val in data]
-        
-        fig = go.Figure(data=[
-            go.Pie(
-                labels=safe_columns,
-                values=safe_data,
-                hole=0.4,
-                textinfo='label+percent',
-                textposition='outside',
-                texttemplate='%{label}<br>%{percent:.1%}',
-                marker=dict(colors=color_sequence),
-                hovertemplate='%{label}<br>数值: %{value:.2f}<br>占比: %{percent:.1%}'
-            )
-        ])
-        
-        fig.update_layout(
-            title=dict(
-                text=str(title),
-                font=dict(size=24)
-            ),
-            height=500,
-            showlegend=True,
-            margin=dict(t=50, b=50, l=50, r=50),
-            plot_bgcolor='white',
-            paper_bgcolor='white',
-            hoverlabel=dict(bgcolor='white'),
-            legend=dict(
-                orientation="h",
-                yanchor="bottom",
-                y=1.02,
-                xanchor="right",
-                x=1
-            )
-        )
-        
-        st.plotly_chart(fig, use_container_width=True, config={'displayModeBar': True})
-        
-    elif chart_type == "scatter":
-        safe_columns = [str(col) for col in columns]
-        safe_data = [float(val) if isinstance(val, (int, float)) else 0 for val in data]
-        
-        # 生成渐变色
-        colors = [i/(len(safe_data)-1) for i in range(len(safe_data))]
-        
-        fig = go.Figure(data=[
-            go.Scatter(
-                x=list(range(len(safe_columns))),
-                y=safe_data,
-                mode='markers',
-                marker=dict(
-                    size=12,
-                    color=colors,
-                    colorscale='Viridis',
-                    showscale=True,
-                    line=dict(width=1, color='white')
-                ),
-                text=safe_columns,
-                hovertemplate='%{text}<br>数值: %{y:.2f}'
-            )
-        ])
-        
-        fig.update_layout(
-            title=dict(
-                text=str(title),
-                font=dict(size=24)
-            ),
-            xaxis=dict(
-                title=dict(
-                    text=str(x_label),
-                    font=dict(size=14)
-                ),
-                tickvals=list(range(len(safe_columns))),
-                ticktext=safe_columns
-            ),
-            yaxis_title=dict(
-                text=str(y_label),
-                font=dict(size=14)
-            ),
-            height=500,
-            showlegend=False,
-            margin=dict(t=50, b=50, l=50, r=50),
-            plot_bgcolor='white',
-            paper_bgcolor='white',
-            hoverlabel=dict(bgcolor='white')
-        )
-        
-        fig.update_xaxes(showgrid=True, gridwidth=1, gridcolor='LightGray')
-        fig.update_yaxes(showgrid=True, gridwidth=1, gridcolor='LightGray')
-        
-        st.plotly_chart(fig, use_container_width=True, config={'displayModeBar': True})
-
-
-@st.cache_data
-def create_data_summary(df: "pd.DataFrame") -> None:
+def create_data_summary(profile: DatasetProfile) -> None:
     """生成优化的数据摘要信息"""
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        st.metric("数据行数", f"{len(df):,}")
+        st.metric("数据行数", f"{profile.rows:,}")
     with col2:
-        st.metric("数据列数", len(df.columns))
+        st.metric("数据列数", len(profile.columns))
     with col3:
-        numeric_cols = df.select_dtypes(include=[np.number]).columns
-        st.metric("数值列数", len(numeric_cols))
+        st.metric("数值列数", len(profile.numeric_columns))
     with col4:
-        missing_data = df.isnull().sum().sum()
-        st.metric("缺失值", f"{missing_data:,}")
+        st.metric("缺失值", f"{profile.missing:,}")
 
 
-def create_correlation_heatmap(df: "pd.DataFrame") -> bool:
+def create_correlation_heatmap(profile: DatasetProfile) -> bool:
     """生成相关性热力图"""
-    numeric_df = df.select_dtypes(include=[np.number])
-    if len(numeric_df.columns) > 1:
-        correlation_matrix = numeric_df.corr()
+    if len(profile.numeric_columns) > 1:
+        correlation_matrix = profile.correlation()
         
         fig = go.Figure(data=go.Heatmap(
             z=correlation_matrix.values,
@@ -436,10 +209,72 @@ def create_correlation_heatmap(df: "pd.DataFrame") -> bool:
         )
         
         st.plotly_chart(fig, use_container_width=True)
+        if isinstance(profile, ApproximateProfile):
+            error = profile.correlation_error().max().max()
+            st.caption(f"基于 {len(profile.sample):,} 行抽样计算，相关系数 95% 置信区间半宽不超过 ±{error:.3f}")
         return True
     return False
 
 
+def get_profile(approximate: bool):
+    """返回当前模式下的概览统计，首次使用时才基于已加载的数据构建"""
+    key = "approx_profile" if approximate else "profile"
+    if st.session_state.get(key) is None:
+        with perf.span("profile.approximate" if approximate else "profile.exact"):
+            builder = ApproximateProfile if approximate else DatasetProfile
+            st.session_state[key] = builder.from_frame(get_df())
+    return st.session_state[key]
+
+
+def get_outlier_report(approximate: bool) -> OutlierReport:
+    """全部数值列的异常值检测结果，近似模式下基于样本计算，每个数据集只计算一次"""
+    key = "approx_outliers" if approximate else "outliers"
+    if st.session_state.get(key) is None:
+        with perf.span("outliers.approximate" if approximate else "outliers"):
+            df = get_profile(True).sample if approximate else get_df()
+            st.session_state[key] = detect_outliers(df, df.select_dtypes(include=[np.number]).columns)
+    return st.session_state[key]
+
+
+def render_approximate_statistics(profile: ApproximateProfile, df: "pd.DataFrame") -> None:
+    """展示近似统计值及其 95% 误差范围"""
+    estimate = profile.describe()
+    error = profile.describe_error()
+    text = estimate.apply(lambda col: col.map("{:,.4g}".format))
+    text = text.where(error.isna(), text + error.apply(lambda col: col.map(" ± {:,.2g}".format)))
+    st.dataframe(text, use_container_width=True)
+    st.caption(f"基于 {len(profile.sample):,} 行样本（抽样比例 {profile.fraction:.1%}），± 为 95% 置信区间半宽，min/max 为样本值")
+    if st.button("🔢 估计各列唯一值数量", key="approx_distinct_button"):
+        st.session_state["approx_distinct"] = True
+    if st.session_state.get("approx_distinct"):
+        with perf.span("profile.distinct"):
+            st.dataframe(profile.distinct(df), use_container_width=True)
+
+
+def render_perf_panel() -> None:
+    """隐藏的性能管理面板：仅当 URL 参数 admin 与环境变量 PERF_ADMIN_TOKEN 一致时显示"""
+    token = os.getenv("PERF_ADMIN_TOKEN", "")
+    if not token or st.query_params.get("admin") != token:
+        return
+    with st.expander("⏱️ 性能监控面板", expanded=False):
+        st.markdown("#### 当前会话")
+        st.dataframe(pd.DataFrame(perf.session_summary(st.session_state["perf_session_id"])), use_container_width=True)
+        st.markdown("#### 进程汇总")
+        st.dataframe(pd.DataFrame(perf.process_summary()), use_container_width=True)
+        st.markdown("#### 会话数据内存")
+        st.dataframe(pd.DataFrame(data_manager.summary()), use_container_width=True)
+        st.markdown("#### 大模型用量")
+        st.dataframe(pd.DataFrame({
+            "当前会话": perf.llm_usage(st.session_state["perf_session_id"]),
+            "进程汇总": perf.llm_usage(),
+        }), use_container_width=True)
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button("📥 导出 JSON lines", data=perf.export_jsonl(), file_name="perf_spans.jsonl", mime="application/x-ndjson")
+        with col2:
+            st.download_button("📥 导出 Prometheus 指标", data=perf.export_prometheus(), file_name="metrics.prom", mime="text/plain")
+
+
 # 页面配置
 
 # 设置页面背景和样式
@@ -483,12 +318,17 @@ st.markdown("""
 # 侧边栏配置
 with st.sidebar:
     st.markdown("### 📁 数据上传")
-    option = st.radio("选择数据文件类型:", ("Excel", "CSV"), help="支持Excel和CSV格式的数据文件")
-    file_type = "xlsx" if option == "Excel" else "csv"
-    data = st.file_uploader(f"上传{option}数据文件", type=file_type)
+    # 按扩展名识别文件类型，Excel 与 CSV 可以混合上传
+    data_files = st.file_uploader("上传Excel/CSV数据文件", type=UPLOAD_TYPES, accept_multiple_files=True, help="可同时上传多个相关文件（如订单表和产品表），在工作区中关联分析")
     
-    if data:
-        st.success("✅ 文件上传成功！")
+    if data_files:
+        st.success(f"✅ 已上传 {len(data_files)} 个文件！")
+        append_mode = st.checkbox("追加模式", help="上传与当前数据集列一致的增量文件，仅处理新增行并增量更新统计信息")
+        # 增量上传控件在确定当前数据集后再渲染，每个数据集各自一个
+        delta_slot = st.container()
+    else:
+        append_mode = False
+    approximate = st.toggle("近似统计模式", help="大数据量时基于抽样和草图快速计算概览统计，并显示误差范围")
         
     st.markdown("### 🎨 图表配置")
     chart_title = st.text_input("图表标题", value="数据分析图表")
@@ -497,242 +337,366 @@ with st.sidebar:
     
     st.markdown("### ℹ️ 使用说明")
     st.info("""
-    1. 上传Excel或CSV数据文件
+    1. 上传一个或多个Excel/CSV数据文件
     2. 查看数据概览和统计信息
     3. 输入分析问题或可视化需求
     4. 获得智能分析结果和图表
     """)
 
-option = st.radio("请选择数据文件类型:", ("Excel", "CSV"), key="hidden", label_visibility="hidden")
-file_type = "xlsx" if option == "Excel" else "csv"
-
-if data:
+if data_files:
     try:
-        if file_type == "xlsx":
-            wb = openpyxl.load_workbook(data)
-            if len(wb.sheetnames) > 1:
-                sheet_option = st.selectbox("选择要加载的工作表：", wb.sheetnames)
-            else:
-                sheet_option = wb.sheetnames[0]
-            st.session_state["df"] = pd.read_excel(data, sheet_name=sheet_option)
-        else:
-            # 尝试不同编码方式读取CSV文件
+        workspace = get_workspace()
+        with perf.span("ingest"):
+            # 每个文件（及 Excel 的每个工作表）作为工作区中的一个数据集，同一来源只解析一次
+            loaded = []
+            for data in data_files:
+                data_type = detect_file_type(data.name)
+                stem = os.path.splitext(data.name)[0]
+                sheets = [None]
+                if data_type == "xlsx":
+                    sheet_names = list_sheet_names(data)
+                    sheets = sheet_names
+                    if len(sheet_names) > 1:
+                        sheets = st.multiselect(f"选择 {data.name} 要加载的工作表：", sheet_names, default=sheet_names[:1], key=f"sheets_{data.file_id}")
+                for sheet in sheets:
+                    name = f"{stem}/{sheet}" if data_type == "xlsx" and len(sheet_names) > 1 else stem
+                    if name in loaded:
+                        name = f"{name} ({len(loaded) + 1})"
+                    workspace.load(name, (data.file_id, sheet), lambda data=data, data_type=data_type, sheet=sheet: read_uploaded_file(data, data_type, sheet))
+                    loaded.append(name)
+            workspace.retain(loaded)
+        
+        # 数据工作区：多个数据集时可定义关联，关联结果缓存后在重跑和智能体查询之间复用
+        with perf.span("panel.workspace"):
+            if len(workspace.datasets) > 1:
+                st.markdown("## 🗂️ 数据工作区")
+                st.dataframe(pd.DataFrame(workspace.summary()), use_container_width=True, hide_index=True)
+                with st.expander("🔗 关联数据集", expanded=not workspace.joins):
+                    col1, col2 = st.columns(2)
+                    with col1:
+                        join_left = st.selectbox("左表", list(workspace.datasets), key="join_left")
+                        join_left_on = st.selectbox("左表关联列", workspace.columns(join_left), key="join_left_on")
+                    with col2:
+                        join_right = st.selectbox("右表", [name for name in workspace.datasets if name != join_left], key="join_right")
+                        right_columns = workspace.columns(join_right)
+                        join_right_on = st.selectbox(
+                            "右表关联列",
+                            right_columns,
+                            index=right_columns.index(join_left_on) if join_left_on in right_columns else 0,
+                            key="join_right_on"
+                        )
+                    join_how = st.radio("关联方式", list(JOIN_HOW), format_func=JOIN_HOW.get, horizontal=True, key="join_how")
+                    if st.button("生成关联数据集", key="join_button"):
+                        try:
+                            workspace.active = workspace.add_join(join_left, join_right, join_left_on, join_right_on, join_how)
+                            st.session_state["active_dataset"] = workspace.active
+                        except (KeyError, TypeError, ValueError) as join_err:
+                            st.error(f"❌ 关联失败: {str(join_err)}")
+            
+            dataset_names = workspace.names
+            if workspace.active not in dataset_names:
+                workspace.active = dataset_names[0] if dataset_names else None
+            if len(dataset_names) > 1:
+                if st.session_state.get("active_dataset") not in dataset_names:
+                    st.session_state["active_dataset"] = workspace.active
+                workspace.active = st.selectbox("选择要分析的数据集：", dataset_names, key="active_dataset")
+        
+        if workspace.active is None:
+            st.info("👆 请至少选择一个工作表")
+            st.stop()
+        
+        # 切换数据集或数据来源变化时重新计算统计量，重跑时复用已有结果
+        source_key = workspace.signature(workspace.active)
+        if st.session_state.get("source_key") != source_key:
+            st.session_state["profile"] = None
+            st.session_state["approx_profile"] = None
+            st.session_state["approx_distinct"] = False
+            st.session_state["outliers"] = None
+            st.session_state["approx_outliers"] = None
+            st.session_state["full_outliers"] = False
+            st.session_state.pop("outlier_mask_export", None)
+            st.session_state["source_key"] = source_key
+        
+        # 追加模式：只解析新增数据，并增量更新概览统计；已追加的增量文件按数据集记录，切换数据集不会重复追加
+        delta_data = None
+        if append_mode:
+            with delta_slot:
+                if workspace.active in workspace.joins:
+                    st.warning("⚠️ 关联数据集不支持追加数据，请选择原始数据集")
+                else:
+                    delta_data = st.file_uploader(f"上传{workspace.active}的增量数据", type=UPLOAD_TYPES, key=f"delta_upload_{workspace.active}")
+        if delta_data and delta_data.file_id not in workspace.applied_deltas(workspace.active):
             try:
-                st.session_state["df"] = pd.read_csv(data, encoding='utf-8')
-            except UnicodeDecodeError:
-                try:
-                    st.session_state["df"] = pd.read_csv(data, encoding='gbk')
-                except UnicodeDecodeError:
-                    st.session_state["df"] = pd.read_csv(data, encoding='latin-1')
-        
-        df = st.session_state["df"]
+                with perf.span("ingest.delta"):
+                    delta_df = get_profile(approximate).conform(read_uploaded_file(delta_data, detect_file_type(delta_data.name)))
+                    # 先保存数据，超出内存上限时统计量保持不变
+                    set_df(pd.concat([get_df(), delta_df], ignore_index=True), delta_data.file_id)
+                    for key in ("profile", "approx_profile"):
+                        if st.session_state[key] is not None:
+                            st.session_state[key].update(delta_df)
+                    st.session_state["outliers"] = None
+                    st.session_state["approx_outliers"] = None
+                    st.session_state.pop("outlier_mask_export", None)
+                st.success(f"✅ 已追加 {len(delta_df):,} 行数据")
+            except ValueError as delta_err:
+                st.error(f"❌ 增量数据无法追加: {str(delta_err)}")
+        
+        df = get_df()
+        profile = get_profile(approximate)
+        # 近似模式下分布图基于样本绘制
+        distribution_df = profile.sample if approximate else df
         
         # 数据概览
-        st.markdown("## 📊 数据概览")
-        create_data_summary(df)
+        with perf.span("panel.overview"):
+            st.markdown("## 📊 数据概览")
+            create_data_summary(profile)
         
         # 数据预览
-        col1, col2 = st.columns([2, 1])
+        with perf.span("panel.preview"):
+            col1, col2 = st.columns([2, 1])
         
-        with col1:
-            with st.expander("📋 原始数据预览", expanded=True):
-                st.dataframe(df, use_container_width=True, height=300)
+            with col1:
+                with st.expander("📋 原始数据预览", expanded=True):
+                    st.dataframe(df, use_container_width=True, height=300)
         
-        with col2:
-            with st.expander("📈 数据统计信息", expanded=True):
-                numeric_df = df.select_dtypes(include=[np.number])
-                if not numeric_df.empty:
-                    st.dataframe(numeric_df.describe(), use_container_width=True)
-                else:
-                    st.info("暂无数值型数据")
+            with col2:
+                with st.expander("📈 数据统计信息", expanded=True):
+                    if profile.numeric_columns and approximate:
+                        render_approximate_statistics(profile, df)
+                    elif profile.numeric_columns:
+                        st.dataframe(profile.describe(), use_container_width=True)
+                    else:
+                        st.info("暂无数值型数据")
         
         # 相关性分析
-        if create_correlation_heatmap(df):
-            st.markdown("## 🔗 数据相关性分析")
+        with perf.span("panel.correlation"):
+            if create_correlation_heatmap(profile):
+                st.markdown("## 🔗 数据相关性分析")
         
         # 新增功能：数据分布分析
-        st.markdown("## 📊 数据分布分析")
-        col1, col2 = st.columns(2)
-        with col1:
-            numeric_columns = df.select_dtypes(include=[np.number]).columns
-            if not numeric_columns.empty:
-                selected_column = st.selectbox("选择要分析的数值列：", numeric_columns)
-                fig = go.Figure()
+        with perf.span("panel.distribution"):
+            st.markdown("## 📊 数据分布分析")
+            col1, col2 = st.columns(2)
+            with col1:
+                numeric_columns = df.select_dtypes(include=[np.number]).columns
+                if not numeric_columns.empty:
+                    selected_column = st.selectbox("选择要分析的数值列：", numeric_columns)
+                    fig = go.Figure()
                 
-                # 添加美化后的直方图
-                fig.add_trace(go.Histogram(
-                    x=df[selected_column],
-                    nbinsx=30,
-                    name="分布直方图",
-                    marker=dict(
-                        color='rgba(55, 128, 191, 0.7)',
-                        line=dict(color='rgba(55, 128, 191, 1)', width=1)
-                    ),
-                    opacity=0.7,
-                    hovertemplate='数值: %{x}<br>频数: %{y}<extra></extra>'
-                ))
+                    # 添加美化后的直方图
+                    fig.add_trace(go.Histogram(
+                        x=distribution_df[selected_column],
+                        nbinsx=30,
+                        name="分布直方图",
+                        marker=dict(
+                            color='rgba(55, 128, 191, 0.7)',
+                            line=dict(color='rgba(55, 128, 191, 1)', width=1)
+                        ),
+                        opacity=0.7,
+                        hovertemplate='数值: %{x}<br>频数: %{y}<extra></extra>'
+                    ))
                 
-                # 添加美化后的小提琴图
-                fig.add_trace(go.Violin(
-                    x=df[selected_column],
-                    name="密度分布",
-                    side='positive',
-                    line_color='rgba(231, 99, 250, 1)',
-                    fillcolor='rgba(231, 99, 250, 0.5)',
-                    points=False,
-                    meanline=dict(visible=True, color='rgba(231, 99, 250, 1)'),
-                    hovertemplate='数值: %{x}<br>密度: %{y}<extra></extra>'
-                ))
+                    # 添加美化后的小提琴图
+                    fig.add_trace(go.Violin(
+                        x=distribution_df[selected_column],
+                        name="密度分布",
+                        side='positive',
+                        line_color='rgba(231, 99, 250, 1)',
+                        fillcolor='rgba(231, 99, 250, 0.5)',
+                        points=False,
+                        meanline=dict(visible=True, color='rgba(231, 99, 250, 1)'),
+                        hovertemplate='数值: %{x}<br>密度: %{y}<extra></extra>'
+                    ))
                 
-                # 添加核密度估计曲线
-                kde = df[selected_column].plot.kde()
-                x_kde = kde.get_lines()[0].get_xdata()
-                y_kde = kde.get_lines()[0].get_ydata()
-                plt.close()
+                    # 添加核密度估计曲线
+                    kde = distribution_df[selected_column].plot.kde()
+                    x_kde = kde.get_lines()[0].get_xdata()
+                    y_kde = kde.get_lines()[0].get_ydata()
+                    plt.close()
                 
-                fig.add_trace(go.Scatter(
-                    x=x_kde,
-                    y=y_kde,
-                    name='核密度估计',
-                    line=dict(color='rgba(50, 205, 50, 0.8)', width=2, dash='dot'),
-                    hovertemplate='数值: %{x:.2f}<br>密度: %{y:.4f}<extra></extra>'
-                ))
+                    fig.add_trace(go.Scatter(
+                        x=x_kde,
+                        y=y_kde,
+                        name='核密度估计',
+                        line=dict(color='rgba(50, 205, 50, 0.8)', width=2, dash='dot'),
+                        hovertemplate='数值: %{x:.2f}<br>密度: %{y:.4f}<extra></extra>'
+                    ))
                 
-                # 更新布局
-                fig.update_layout(
-                    title=dict(
-                        text=f"{selected_column}的分布情况",
-                        font=dict(size=24, color='#333'),
-                        x=0.5,
-                        y=0.95
-                    ),
-                    showlegend=True,
-                    height=500,
-                    template='plotly_white',
-                    margin=dict(t=100, b=50, l=50, r=50),
-                    legend=dict(
-                        yanchor="top",
-                        y=0.99,
-                        xanchor="right",
-                        x=0.99,
-                        bgcolor='rgba(255, 255, 255, 0.8)',
-                        bordercolor='rgba(0, 0, 0, 0.2)',
-                        borderwidth=1
-                    ),
-                    hoverlabel=dict(
-                        bgcolor='white',
-                        font_size=12,
-                        font_family='Arial'
+                    # 更新布局
+                    fig.update_layout(
+                        title=dict(
+                            text=f"{selected_column}的分布情况",
+                            font=dict(size=24, color='#333'),
+                            x=0.5,
+                            y=0.95
+                        ),
+                        showlegend=True,
+                        height=500,
+                        template='plotly_white',
+                        margin=dict(t=100, b=50, l=50, r=50),
+                        legend=dict(
+                            yanchor="top",
+                            y=0.99,
+                            xanchor="right",
+                            x=0.99,
+                            bgcolor='rgba(255, 255, 255, 0.8)',
+                            bordercolor='rgba(0, 0, 0, 0.2)',
+                            borderwidth=1
+                        ),
+                        hoverlabel=dict(
+                            bgcolor='white',
+                            font_size=12,
+                            font_family='Arial'
+                        )
                     )
-                )
                 
-                # 更新坐标轴
-                fig.update_xaxes(
-                    title=dict(text=selected_column, font=dict(size=14)),
-                    showgrid=True,
-                    gridwidth=1,
-                    gridcolor='rgba(0, 0, 0, 0.1)',
-                    zeroline=True,
-                    zerolinewidth=1.5,
-                    zerolinecolor='rgba(0, 0, 0, 0.3)'
-                )
-                fig.update_yaxes(
-                    title=dict(text='频数/密度', font=dict(size=14)),
-                    showgrid=True,
-                    gridwidth=1,
-                    gridcolor='rgba(0, 0, 0, 0.1)',
-                    zeroline=True,
-                    zerolinewidth=1.5,
-                    zerolinecolor='rgba(0, 0, 0, 0.3)'
-                )
+                    # 更新坐标轴
+                    fig.update_xaxes(
+                        title=dict(text=selected_column, font=dict(size=14)),
+                        showgrid=True,
+                        gridwidth=1,
+                        gridcolor='rgba(0, 0, 0, 0.1)',
+                        zeroline=True,
+                        zerolinewidth=1.5,
+                        zerolinecolor='rgba(0, 0, 0, 0.3)'
+                    )
+                    fig.update_yaxes(
+                        title=dict(text='频数/密度', font=dict(size=14)),
+                        showgrid=True,
+                        gridwidth=1,
+                        gridcolor='rgba(0, 0, 0, 0.1)',
+                        zeroline=True,
+                        zerolinewidth=1.5,
+                        zerolinecolor='rgba(0, 0, 0, 0.3)'
+                    )
                 
-                st.plotly_chart(fig, use_container_width=True, config={
-                    'displayModeBar': True,
-                    'displaylogo': False,
-                    'modeBarButtonsToAdd': ['drawline', 'drawopenpath', 'eraseshape']
-                })
+                    st.plotly_chart(fig, use_container_width=True, config={
+                        'displayModeBar': True,
+                        'displaylogo': False,
+                        'modeBarButtonsToAdd': ['drawline', 'drawopenpath', 'eraseshape']
+                    })
 
-        with col2:
+        with perf.span("panel.outlier"):
+            with col2:
+                if not numeric_columns.empty:
+                    # 箱线图用于检测异常值，统计量由后端预先计算，只向前端发送汇总值和异常点
+                    report = get_outlier_report(approximate)
+                    box = report.box_stats.loc[selected_column]
+                    outlier_values = report.outlier_values(distribution_df, selected_column)
+                    fig = go.Figure()
+                    fig.add_trace(go.Box(
+                        q1=[box["q1"]],
+                        median=[box["median"]],
+                        q3=[box["q3"]],
+                        lowerfence=[box["lowerfence"]],
+                        upperfence=[box["upperfence"]],
+                        mean=[box["mean"]],
+                        x=["箱线图"],
+                        name="箱线图",
+                        marker_color='rgb(107, 174, 214)',
+                        line_color='rgb(8, 81, 156)'
+                    ))
+                    fig.add_trace(go.Scatter(
+                        x=["箱线图"] * len(outlier_values),
+                        y=outlier_values,
+                        mode='markers',
+                        name="异常值",
+                        marker=dict(color='rgb(214, 39, 40)', size=5, opacity=0.6),
+                        hovertemplate='行号: %{text}<br>数值: %{y}<extra></extra>',
+                        text=outlier_values.index
+                    ))
+                    fig.update_layout(
+                        title_text=f"{selected_column}的异常值检测",
+                        showlegend=True,
+                        height=400
+                    )
+                    st.plotly_chart(fig, use_container_width=True)
+
+        # 全表异常值检测
+        with perf.span("panel.quality"):
             if not numeric_columns.empty:
-                # 箱线图用于检测异常值
-                fig = go.Figure()
-                fig.add_trace(go.Box(
-                    y=df[selected_column],
-                    name="箱线图",
-                    boxpoints='outliers',
-                    marker_color='rgb(107, 174, 214)',
-                    line_color='rgb(8, 81, 156)'
-                ))
-                fig.update_layout(
-                    title_text=f"{selected_column}的异常值检测",
-                    showlegend=True,
-                    height=400
+                st.markdown("## 🧹 数据质量检测")
+                report = get_outlier_report(approximate)
+                st.dataframe(
+                    report.summary.style.format({col: "{:.2%}" for col in report.summary.columns if col.endswith("占比")}),
+                    use_container_width=True
                 )
-                st.plotly_chart(fig, use_container_width=True)
-
+                st.caption("IQR：超出 1.5 倍四分位距；MAD：稳健 Z 值绝对值大于 3.5；Z-score：标准分数绝对值大于 3")
+                if approximate:
+                    st.caption(f"基于 {len(profile.sample):,} 行样本估计，异常数为样本中的数量")
+                with st.expander("📥 导出异常行标记", expanded=False):
+                    # 逐行标记需要全量数据，近似模式下点击后才计算
+                    if approximate and not st.session_state.get("full_outliers"):
+                        if st.button("🔍 对全量数据检测异常行", key="full_outliers_button"):
+                            st.session_state["full_outliers"] = True
+                    if not approximate or st.session_state.get("full_outliers"):
+                        flagged_rows = get_outlier_report(False).flagged_rows()
+                        st.write(f"共 {len(flagged_rows):,} 行至少被一种方法标记")
+                        render_table_export(flagged_rows, "outlier_mask")
+        
         # 新增功能：时间序列分析
-        st.markdown("## 📈 时间序列分析")
-        date_columns = df.select_dtypes(include=['datetime64']).columns
-        if not date_columns.empty:
-            col1, col2 = st.columns(2)
-            with col1:
-                date_column = st.selectbox("选择时间列：", date_columns)
-                numeric_column = st.selectbox("选择数值列：", numeric_columns)
+        with perf.span("panel.timeseries"):
+            st.markdown("## 📈 时间序列分析")
+            date_columns = df.select_dtypes(include=['datetime64']).columns
+            if not date_columns.empty:
+                col1, col2 = st.columns(2)
+                with col1:
+                    date_column = st.selectbox("选择时间列：", date_columns)
+                    numeric_column = st.selectbox("选择数值列：", numeric_columns)
                 
-                # 时间序列趋势图
-                fig = go.Figure()
-                fig.add_trace(go.Scatter(
-                    x=df[date_column],
-                    y=df[numeric_column],
-                    mode='lines+markers',
-                    name='实际值',
-                    line=dict(color='rgb(31, 119, 180)')
-                ))
-                
-                # 添加移动平均线
-                ma_period = 7
-                if len(df) >= ma_period:
-                    ma = df[numeric_column].rolling(window=ma_period).mean()
-                    fig.add_trace(go.Scatter(
-                        x=df[date_column],
-                        y=ma,
-                        mode='lines',
-                        name=f'{ma_period}日移动平均',
-                        line=dict(color='rgb(255, 127, 14)', dash='dash')
-                    ))
-                
-                fig.update_layout(
-                    title=f"{numeric_column}的时间序列趋势",
-                    xaxis_title="时间",
-                    yaxis_title=numeric_column,
-                    height=400
-                )
-                st.plotly_chart(fig, use_container_width=True)
-            
-            with col2:
-                # 季节性分析
-                if len(df) >= 30:  # 确保有足够的数据进行季节性分析
-                    df['月份'] = df[date_column].dt.month
-                    monthly_avg = df.groupby('月份')[numeric_column].mean().reset_index()
-                    
+                    # 时间序列趋势图
                     fig = go.Figure()
                     fig.add_trace(go.Scatter(
-                        x=monthly_avg['月份'],
-                        y=monthly_avg[numeric_column],
+                        x=df[date_column],
+                        y=df[numeric_column],
                         mode='lines+markers',
-                        name='月度平均',
-                        line=dict(color='rgb(44, 160, 44)')
+                        name='实际值',
+                        line=dict(color='rgb(31, 119, 180)')
                     ))
-                    
+                
+                    # 添加移动平均线
+                    ma_period = 7
+                    if len(df) >= ma_period:
+                        ma = df[numeric_column].rolling(window=ma_period).mean()
+                        fig.add_trace(go.Scatter(
+                            x=df[date_column],
+                            y=ma,
+                            mode='lines',
+                            name=f'{ma_period}日移动平均',
+                            line=dict(color='rgb(255, 127, 14)', dash='dash')
+                        ))
+                
                     fig.update_layout(
-                        title=f"{numeric_column}的季节性分析",
-                        xaxis_title="月份",
-                        yaxis_title=f"平均{numeric_column}",
+                        title=f"{numeric_column}的时间序列趋势",
+                        xaxis_title="时间",
+                        yaxis_title=numeric_column,
                         height=400
                     )
                     st.plotly_chart(fig, use_container_width=True)
-        else:
-            st.info("未检测到时间类型的列，无法进行时间序列分析。请确保您的数据包含日期时间列。")
+            
+                with col2:
+                    # 季节性分析
+                    if profile.rows >= 30 and date_column in profile.date_columns:  # 确保有足够的数据进行季节性分析
+                        monthly_avg = profile.monthly_mean(date_column, numeric_column)
+                    
+                        fig = go.Figure()
+                        fig.add_trace(go.Scatter(
+                            x=monthly_avg['月份'],
+                            y=monthly_avg[numeric_column],
+                            mode='lines+markers',
+                            name='月度平均',
+                            line=dict(color='rgb(44, 160, 44)')
+                        ))
+                    
+                        fig.update_layout(
+                            title=f"{numeric_column}的季节性分析",
+                            xaxis_title="月份",
+                            yaxis_title=f"平均{numeric_column}",
+                            height=400
+                        )
+                        st.plotly_chart(fig, use_container_width=True)
+            else:
+                st.info("未检测到时间类型的列，无法进行时间序列分析。请确保您的数据包含日期时间列。")
         
     except Exception as e:
         st.error(f"❌ 数据加载失败: {str(e)}")
@@ -741,14 +705,14 @@ if data:
 # 智能分析区域
 st.markdown("## 🤖 智能数据分析")
 
-if "df" in st.session_state:
+if has_df():
     
     st.markdown("### 💬 自定义分析")
     query = st.text_area(
         "请输入您的数据分析问题或可视化需求：",
         placeholder="例如：分析销售数据的月度趋势，或者制作产品类别的销量对比图表",
         height=100,
-        disabled="df" not in st.session_state
+        disabled=not has_df()
     )
     
     col1, col2, col3 = st.columns([1, 2, 1])
@@ -759,90 +723,32 @@ else:
     button = False
     query = None
 
-if button and not data:
+if button and not data_files:
     st.warning("⚠️ 请先上传数据文件")
     st.stop()
 
 if query and button:
     with st.spinner("🤖 AI正在深度分析中，请稍等..."):
-        try:
-            result = dataframe_agent(st.session_state["df"], query)
-            
-            st.markdown("## 📋 分析结果")
-            
-            # 显示调试信息（如果存在）
-            if "debug_info" in result:
-                with st.expander("🔧 调试信息", expanded=False):
-                    st.warning(result["debug_info"])
-            
-            if "error" in result:
-                with st.expander("❌ 错误详情", expanded=False):
-                    st.error(result["error"])
-            
-            if "answer" in result:
-                st.markdown("### 💡 分析洞察")
-                st.success(result["answer"])
-            
-            if "table" in result:
-                st.markdown("### 📊 数据表格")
-                try:
-                    table_df = pd.DataFrame(result["table"]["data"], columns=result["table"]["columns"])
-                    st.dataframe(table_df, use_container_width=True)
-                    
-                    # 提供下载选项
-                    csv = table_df.to_csv(index=False, encoding='utf-8-sig')
-                    st.download_button(
-                        label="📥 下载表格数据",
-                        data=csv,
-                        file_name=f'analysis_result_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv',
-                        mime='text/csv'
-                    )
-                except (KeyError, ValueError, pandas.errors.EmptyDataError) as table_err:
-                    st.error(f"表格数据格式错误: {str(table_err)}")
-                    st.json(result["table"])  # 显示原始数据结构
-            
-            if "bar" in result:
-                st.markdown("### 📊 柱状图分析")
-                try:
-                    create_advanced_chart(result["bar"], "bar", chart_title, x_axis_label, y_axis_label)
-                except Exception as chart_err:
-                    st.error(f"柱状图生成错误: {str(chart_err)}")
-                    st.json(result["bar"])  # 显示原始数据结构
-            
-            if "line" in result:
-                st.markdown("### 📈 趋势线图")
-                try:
-                    create_advanced_chart(result["line"], "line", chart_title, x_axis_label, y_axis_label)
-                except Exception as chart_err:
-                    st.error(f"折线图生成错误: {str(chart_err)}")
-                    st.json(result["line"])  # 显示原始数据结构
-            
-            if "pie" in result:
-                st.markdown("### 🥧 饼图分析")
-                try:
-                    create_advanced_chart(result["pie"], "pie", chart_title, x_axis_label, y_axis_label)
-                except Exception as chart_err:
-                    st.error(f"饼图生成错误: {str(chart_err)}")
-                    st.json(result["pie"])  # 显示原始数据结构
-            
-            if "scatter" in result:
-                st.markdown("### 🔸 散点图分析")
-                try:
-                    create_advanced_chart(result["scatter"], "scatter", chart_title, x_axis_label, y_axis_label)
-                except Exception as chart_err:
-                    st.error(f"散点图生成错误: {str(chart_err)}")
-                    st.json(result["scatter"])  # 显示原始数据结构
-            
-            # 显示完整的返回结果用于调试
-            with st.expander("🔍 完整返回结果（调试用）", expanded=False):
-                st.json(result)
-                
-        except Exception as e:
-            st.error(f"❌ 分析过程中出现错误: {str(e)}")
-            st.info("💡 请尝试重新表述您的问题或检查数据格式")
-            # 显示详细错误信息
-            with st.expander("错误详情", expanded=False):
-                st.code(str(e))
+        # 结果保存在会话中，翻页、导出等交互触发的重跑不会丢失结果
+        st.session_state["result"] = dataframe_agent(get_df(), query)
+        clear_result_state("result_table")
+
+if "result" in st.session_state:
+    result = st.session_state["result"]
+    try:
+        st.markdown("## 📋 分析结果")
+        
+        render_result(result, "result_table", chart_title, x_axis_label, y_axis_label)
+        
+        # 显示完整的返回结果用于调试
+        with st.expander("🔍 完整返回结果（调试用）", expanded=False):
+            st.json(result)
+    except Exception as e:
+        st.error(f"❌ 分析过程中出现错误: {str(e)}")
+        st.info("💡 请尝试重新表述您的问题或检查数据格式")
+        # 显示详细错误信息
+        with st.expander("错误详情", expanded=False):
+            st.code(str(e))
 
 # 页脚
 st.markdown("""
@@ -850,6 +756,7 @@ st.markdown("""
     <p>📈 数据分析智能体 让数据洞察更简单 | Powered by AI</p>
 </div>
 """, unsafe_allow_html=True)
+render_perf_panel()
 st.markdown("### 🤖 AI 聊天")
 if st.button("进入AI聊天页面", use_container_width=True):
     st.switch_page("pages/chat.py")
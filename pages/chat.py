@@ -0,0 +1,71 @@
+import streamlit as st
+
+import perf
+from components import clear_result_state, get_df, get_workspace, has_df, init_session, render_result
+from conversation import Conversation
+from utils import dataframe_agent
+
+st.set_page_config(
+    page_title="AI 聊天",
+    page_icon="🤖",
+    layout="wide",
+    initial_sidebar_state="expanded"
+)
+
+init_session()
+
+
+def reset_conversation() -> None:
+    # 释放各轮结果在会话中缓存的表格与导出文件
+    if "conversation" in st.session_state:
+        for turn in st.session_state["conversation"].turns:
+            clear_result_state(f"chat_{turn['id']}")
+    st.session_state["conversation"] = Conversation()
+
+
+st.title("🤖 AI 聊天")
+st.caption("基于已上传的数据进行多轮追问；“只看2023年”“前10项”“改成折线图”等追问直接基于上一轮结果处理，无需重新分析")
+
+if not has_df():
+    st.info("👆 请先在主页上传数据文件")
+    st.page_link("main.py", label="返回主页", icon="🏠")
+    st.stop()
+
+# 切换分析的数据集后，历史结果不再适用，重新开始对话
+workspace = get_workspace()
+if st.session_state.get("chat_source") != workspace.signature(workspace.active):
+    reset_conversation()
+    st.session_state["chat_source"] = workspace.signature(workspace.active)
+conversation = st.session_state["conversation"]
+st.caption(f"🗂️ 当前数据集：{workspace.active}")
+
+with st.sidebar:
+    st.page_link("main.py", label="返回主页", icon="🏠")
+    if st.button("🗑️ 清空对话", use_container_width=True):
+        reset_conversation()
+        st.rerun()
+    if conversation.summary:
+        with st.expander("📝 较早对话摘要", expanded=False):
+            for line in conversation.summary:
+                st.markdown(f"- {line}")
+
+for turn in conversation.turns:
+    with st.chat_message("user"):
+        st.markdown(turn["query"])
+    with st.chat_message("assistant"):
+        if turn["source"] == "local":
+            st.caption("⚡ 基于上一轮结果直接生成，未调用模型")
+        render_result(turn["result"], f"chat_{turn['id']}", table_df=turn["table"] if "table" in turn["result"] else None)
+
+query = st.chat_input("继续提问，例如：只看2023年 / 改成折线图")
+if query:
+    with perf.span("chat.turn"):
+        result = conversation.refine_locally(query)
+        source = "local"
+        if result is None:
+            source = "llm"
+            with st.spinner("🤖 AI 正在分析数据..."):
+                result = dataframe_agent(get_df(), query, history=conversation.context_messages())
+    for turn in conversation.add(query, result, source):
+        clear_result_state(f"chat_{turn['id']}")
+    st.rerun()
@@ -0,0 +1,258 @@
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict, defaultdict, deque
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows 下没有 resource 模块
+    resource = None
+
+# 通过环境变量控制：PERF_TRACE_MEMORY=1 开启 tracemalloc 内存峰值统计（有额外开销）
+# PERF_LOG_PATH 指定 JSON lines 日志文件路径，为空则不落盘
+TRACE_MEMORY = os.getenv("PERF_TRACE_MEMORY", "0") == "1"
+LOG_PATH = os.getenv("PERF_LOG_PATH", "")
+RECENT_LIMIT = 1000
+# 按会话聚合的统计最多保留的会话数，超出时淘汰最久未活动的会话
+SESSION_LIMIT = 200
+
+_lock = threading.Lock()
+_current_session = contextvars.ContextVar("perf_session", default="-")
+_process_stats = defaultdict(lambda: {"count": 0, "total": 0.0, "max": 0.0, "mem_peak": 0.0})
+_session_stats = OrderedDict()
+_recent = deque(maxlen=RECENT_LIMIT)
+_USAGE_FIELDS = ("calls", "prompt_tokens", "completion_tokens", "cached_tokens", "seconds")
+_process_usage = dict.fromkeys(_USAGE_FIELDS, 0)
+_session_usage = OrderedDict()
+
+
+def bind_session(session_id: str) -> None:
+    """将当前脚本线程绑定到指定会话，后续的埋点都会按该会话聚合"""
+    _current_session.set(session_id)
+
+
+def forget_session(session_id: str) -> None:
+    """丢弃会话的聚合统计（会话结束或数据过期时调用），进程汇总不受影响"""
+    with _lock:
+        _session_stats.pop(session_id, None)
+        _session_usage.pop(session_id, None)
+
+
+def _session_entry(table: OrderedDict, session_id: str, factory):
+    # 调用方需持有 _lock：最近活动的会话移到末尾，超出上限时淘汰最久未活动的会话
+    entry = table.get(session_id)
+    if entry is None:
+        entry = table[session_id] = factory()
+        if len(table) > SESSION_LIMIT:
+            table.popitem(last=False)
+    else:
+        table.move_to_end(session_id)
+    return entry
+
+
+def _rss_mb() -> float:
+    """当前进程的常驻内存峰值（MB）"""
+    if resource is None:
+        return 0.0
+    # Linux 下 ru_maxrss 单位为 KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _write_log(record: dict) -> None:
+    if LOG_PATH:
+        with open(LOG_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def _record(name: str, session_id: str, elapsed: float, mem_peak: float) -> None:
+    record = {
+        "ts": time.time(),
+        "span": name,
+        "session": session_id,
+        "seconds": round(elapsed, 6),
+        "mem_peak_mb": round(mem_peak, 3),
+        "rss_mb": round(_rss_mb(), 1),
+    }
+    with _lock:
+        session_stats = _session_entry(_session_stats, session_id, lambda: defaultdict(lambda: {"count": 0, "total": 0.0, "max": 0.0, "mem_peak": 0.0}))
+        for stats in (_process_stats[name], session_stats[name]):
+            stats["count"] += 1
+            stats["total"] += elapsed
+            stats["max"] = max(stats["max"], elapsed)
+            stats["mem_peak"] = max(stats["mem_peak"], mem_peak)
+        _recent.append(record)
+        _write_log(record)
+
+
+def record_llm_usage(prompt_tokens: int, completion_tokens: int, cached_tokens: int, seconds: float, max_tokens: int) -> None:
+    """记录一次大模型调用的 token 用量与耗时"""
+    session_id = _current_session.get()
+    record = {
+        "ts": time.time(),
+        "span": "llm.usage",
+        "session": session_id,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "cached_tokens": cached_tokens,
+        "max_tokens": max_tokens,
+        "seconds": round(seconds, 6),
+    }
+    with _lock:
+        session_usage = _session_entry(_session_usage, session_id, lambda: dict.fromkeys(_USAGE_FIELDS, 0))
+        for usage in (_process_usage, session_usage):
+            usage["calls"] += 1
+            usage["prompt_tokens"] += prompt_tokens
+            usage["completion_tokens"] += completion_tokens
+            usage["cached_tokens"] += cached_tokens
+            usage["seconds"] += seconds
+        _recent.append(record)
+        _write_log(record)
+
+
+def llm_usage(session_id: str = None) -> dict:
+    """大模型调用的累计用量，不指定会话时返回进程汇总"""
+    with _lock:
+        usage = _process_usage if session_id is None else _session_usage.get(session_id, dict.fromkeys(_USAGE_FIELDS, 0))
+        return dict(usage)
+
+
+class _MemoryFrame:
+    __slots__ = ("start", "peak")
+
+    def __init__(self, start: int):
+        self.start = start
+        self.peak = start
+
+
+# tracemalloc 的峰值是进程级的：进行中的代码块各自记录峰值，重置全局峰值前先计入所有进行中的代码块，
+# 嵌套或并发的代码块不会互相清零；并发会话的分配会同时计入各自进行中的代码块
+_trace_lock = threading.Lock()
+_open_frames = []
+_started_tracing = False
+
+
+def _fold_peak() -> None:
+    # 调用方需持有 _trace_lock
+    peak = tracemalloc.get_traced_memory()[1]
+    for frame in _open_frames:
+        frame.peak = max(frame.peak, peak)
+
+
+def _enter_memory_frame() -> _MemoryFrame:
+    global _started_tracing
+    with _trace_lock:
+        if tracemalloc.is_tracing():
+            _fold_peak()
+        else:
+            tracemalloc.start()
+            _started_tracing = True
+        tracemalloc.reset_peak()
+        frame = _MemoryFrame(tracemalloc.get_traced_memory()[0])
+        _open_frames.append(frame)
+        return frame
+
+
+def _exit_memory_frame(frame: _MemoryFrame) -> float:
+    """结束内存统计，返回代码块内相对起点的内存峰值（MB）"""
+    global _started_tracing
+    with _trace_lock:
+        _fold_peak()
+        _open_frames[:] = [f for f in _open_frames if f is not frame]
+        # 只有由本模块开启且没有其他进行中的代码块时才停止跟踪
+        if not _open_frames and _started_tracing:
+            tracemalloc.stop()
+            _started_tracing = False
+    return (frame.peak - frame.start) / 1024 / 1024
+
+
+@contextmanager
+def span(name: str):
+    """统计代码块的耗时与内存峰值"""
+    frame = _enter_memory_frame() if TRACE_MEMORY else None
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        mem_peak = _exit_memory_frame(frame) if frame is not None else 0.0
+        _record(name, _current_session.get(), elapsed, mem_peak)
+
+
+def timed(name: str):
+    """函数级埋点装饰器"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _rows(stats: dict) -> list:
+    return [
+        {
+            "span": name,
+            "count": s["count"],
+            "total_s": round(s["total"], 4),
+            "avg_s": round(s["total"] / s["count"], 4) if s["count"] else 0.0,
+            "max_s": round(s["max"], 4),
+            "mem_peak_mb": round(s["mem_peak"], 3),
+        }
+        for name, s in sorted(stats.items())
+    ]
+
+
+def process_summary() -> list:
+    """按进程聚合的埋点统计"""
+    with _lock:
+        return _rows(_process_stats)
+
+
+def session_summary(session_id: str) -> list:
+    """按会话聚合的埋点统计"""
+    with _lock:
+        return _rows(_session_stats.get(session_id, {}))
+
+
+def export_jsonl() -> str:
+    """导出最近的埋点记录（JSON lines）"""
+    with _lock:
+        return "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in _recent)
+
+
+def export_prometheus() -> str:
+    """导出 Prometheus 文本格式的进程级指标"""
+    lines = [
+        "# HELP sjfx_span_seconds 埋点代码块耗时",
+        "# TYPE sjfx_span_seconds summary",
+    ]
+    with _lock:
+        items = sorted(_process_stats.items())
+        for name, s in items:
+            lines.append(f'sjfx_span_seconds_count{{span="{name}"}} {s["count"]}')
+            lines.append(f'sjfx_span_seconds_sum{{span="{name}"}} {s["total"]:.6f}')
+        lines.append("# TYPE sjfx_span_seconds_max gauge")
+        for name, s in items:
+            lines.append(f'sjfx_span_seconds_max{{span="{name}"}} {s["max"]:.6f}')
+        lines.append("# TYPE sjfx_span_memory_peak_megabytes gauge")
+        for name, s in items:
+            lines.append(f'sjfx_span_memory_peak_megabytes{{span="{name}"}} {s["mem_peak"]:.3f}')
+        lines.append(f"# HELP sjfx_tracked_sessions 保留聚合统计的会话数（最近活动的 {SESSION_LIMIT} 个以内）")
+        lines.append("# TYPE sjfx_tracked_sessions gauge")
+        lines.append(f"sjfx_tracked_sessions {len(_session_stats)}")
+        lines.append("# TYPE sjfx_llm_calls_total counter")
+        lines.append(f"sjfx_llm_calls_total {_process_usage['calls']}")
+        lines.append("# TYPE sjfx_llm_tokens_total counter")
+        for kind in ("prompt", "completion", "cached"):
+            lines.append(f'sjfx_llm_tokens_total{{kind="{kind}"}} {_process_usage[kind + "_tokens"]}')
+        lines.append("# TYPE sjfx_llm_seconds_total counter")
+        lines.append(f"sjfx_llm_seconds_total {_process_usage['seconds']:.6f}")
+    lines.append("# TYPE sjfx_process_max_rss_megabytes gauge")
+    lines.append(f"sjfx_process_max_rss_megabytes {_rss_mb():.1f}")
+    return "\n".join(lines) + "\n"
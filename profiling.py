@@ -0,0 +1,490 @@
+import numpy as np
+import pandas as pd
+
+# 近似统计模式的默认样本量
+APPROX_SAMPLE_SIZE = 50000
+# 误差范围对应的 95% 置信水平
+Z_95 = 1.96
+
+
+class TDigest:
+    """可合并的 t-digest 分位数草图，压缩过程完全向量化"""
+
+    def __init__(self, compression: int = 200):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.min = np.inf
+        self.max = -np.inf
+
+    @property
+    def count(self) -> float:
+        return float(self.weights.sum())
+
+    def update(self, values) -> None:
+        """加入一批原始数据"""
+        values = np.asarray(values, dtype=float)
+        if not len(values):
+            return
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self._compress(np.concatenate([self.means, values]), np.concatenate([self.weights, np.ones(len(values))]))
+
+    def merge(self, other: "TDigest") -> None:
+        """合并另一个草图"""
+        if not len(other.means):
+            return
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress(np.concatenate([self.means, other.means]), np.concatenate([self.weights, other.weights]))
+
+    def _compress(self, means: "np.ndarray", weights: "np.ndarray") -> None:
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+        cum = np.cumsum(weights)
+        q = (cum - weights / 2) / cum[-1]
+        # k1 尺度函数：同一个整数区间内的点合并为一个质心，保证每个质心在 k 空间的跨度不超过 1
+        k = self.compression / (2 * np.pi) * np.arcsin(2 * q - 1)
+        bucket = np.floor(k)
+        starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+        self.weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / self.weights
+
+    def quantile(self, q):
+        """估计分位数，q 可以是标量或数组"""
+        if not len(self.means):
+            return np.full(np.shape(q), np.nan) if np.ndim(q) else np.nan
+        cum = np.cumsum(self.weights)
+        total = cum[-1]
+        centers = cum - self.weights / 2
+        return np.interp(np.asarray(q) * total, np.r_[0, centers, total], np.r_[self.min, self.means, self.max])
+
+    def rank_error(self, q):
+        """k1 尺度函数下分位数 q 处的秩误差上界"""
+        q = np.asarray(q, dtype=float)
+        return np.pi * np.sqrt(q * (1 - q)) / self.compression
+
+
+class HyperLogLog:
+    """可合并的 HyperLogLog 唯一值计数草图"""
+
+    def __init__(self, precision: int = 12):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    @property
+    def relative_error(self) -> float:
+        return 1.04 / np.sqrt(len(self.registers))
+
+    def update(self, series: "pd.Series") -> None:
+        """加入一列数据（缺失值不计入）"""
+        hashes = pd.util.hash_pandas_object(series.dropna(), index=False).to_numpy()
+        if not len(hashes):
+            return
+        remaining_bits = 64 - self.precision
+        index = (hashes >> np.uint64(remaining_bits)).astype(np.intp)
+        rest = hashes & np.uint64((1 << remaining_bits) - 1)
+        # rest 小于 2**53，转换为浮点数后 frexp 给出的指数即为其二进制位数
+        bit_length = np.frexp(rest.astype(float))[1]
+        rank = (remaining_bits - bit_length + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other: "HyperLogLog") -> None:
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self) -> float:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(int)))
+        zeros = np.count_nonzero(self.registers == 0)
+        # 小基数时使用线性计数修正
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * np.log(m / zeros)
+        return float(estimate)
+
+
+class _ProfileBase:
+    """概览统计的公共部分：列结构、行数与缺失值计数"""
+
+    def __init__(self, columns, numeric_columns, date_columns):
+        self.columns = list(columns)
+        self.numeric_columns = list(numeric_columns)
+        self.date_columns = list(date_columns)
+        self.rows = 0
+        self.nulls = pd.Series(0, index=self.columns, dtype="int64")
+
+    @classmethod
+    def _from_schema(cls, df: "pd.DataFrame", **kwargs):
+        return cls(
+            df.columns,
+            df.select_dtypes(include=[np.number]).columns,
+            df.select_dtypes(include=["datetime64"]).columns,
+            **kwargs
+        )
+
+    def _count_nulls(self, df: "pd.DataFrame") -> None:
+        self.nulls = self.nulls.add(df.isna().sum().reindex(self.columns, fill_value=0), fill_value=0).astype("int64")
+
+    @property
+    def missing(self) -> int:
+        return int(self.nulls.sum())
+
+    def conform(self, df: "pd.DataFrame") -> "pd.DataFrame":
+        """将增量数据的列顺序和类型对齐到当前数据集"""
+        missing_columns = [col for col in self.columns if col not in df.columns]
+        if missing_columns:
+            raise ValueError(f"增量数据缺少列: {', '.join(map(str, missing_columns))}")
+        df = df[self.columns].copy()
+        for col in self.numeric_columns:
+            if not pd.api.types.is_numeric_dtype(df[col]):
+                df[col] = pd.to_numeric(df[col], errors="coerce")
+        for col in self.date_columns:
+            if not pd.api.types.is_datetime64_any_dtype(df[col]):
+                df[col] = pd.to_datetime(df[col], errors="coerce")
+        return df
+
+
+class DatasetProfile(_ProfileBase):
+    """数据集概览统计，全部由可合并的中间量构成，追加数据时只需处理新增的行"""
+
+    def __init__(self, columns, numeric_columns, date_columns):
+        super().__init__(columns, numeric_columns, date_columns)
+        size = len(self.numeric_columns)
+        # Welford / Chan 合并所需的计数、均值和二阶中心矩
+        self.count = np.zeros(size)
+        self.mean = np.zeros(size)
+        self.m2 = np.zeros(size)
+        self.min = np.full(size, np.inf)
+        self.max = np.full(size, -np.inf)
+        self.digests = [TDigest() for _ in range(size)]
+        # 成对相关系数所需的平移后求和量，平移量在第一批数据时确定以减小舍入误差
+        self.shift = None
+        self.pair_count = np.zeros((size, size))
+        self.pair_sum = np.zeros((size, size))
+        self.pair_sum_sq = np.zeros((size, size))
+        self.pair_cross = np.zeros((size, size))
+        # 时间列 -> 按月份（1-12）汇总的 sum/count
+        self.monthly = {}
+        self.quantiles = None
+
+    @classmethod
+    def from_frame(cls, df: "pd.DataFrame") -> "DatasetProfile":
+        profile = cls._from_schema(df)
+        profile.update(df)
+        # 首次加载时分位数可以精确计算，追加数据后改用 t-digest 估计
+        if profile.numeric_columns:
+            profile.quantiles = df[profile.numeric_columns].quantile([0.25, 0.5, 0.75])
+        return profile
+
+    def _numeric_values(self, df: "pd.DataFrame") -> "np.ndarray":
+        frame = df[self.numeric_columns]
+        if not all(pd.api.types.is_numeric_dtype(dtype) for dtype in frame.dtypes):
+            frame = frame.apply(pd.to_numeric, errors="coerce")
+        return frame.to_numpy(dtype=float, na_value=np.nan)
+
+    def update(self, df: "pd.DataFrame") -> None:
+        """合并一批新增数据的统计量"""
+        if df.empty:
+            return
+        self.quantiles = None
+        self.rows += len(df)
+        self._count_nulls(df)
+        if not self.numeric_columns:
+            return
+
+        values = self._numeric_values(df)
+        mask = ~np.isnan(values)
+        filled = np.where(mask, values, 0.0)
+
+        # 当前批次的计数、均值、二阶中心矩，再按 Chan 公式并入总体
+        count = mask.sum(axis=0).astype(float)
+        mean = np.divide(filled.sum(axis=0), count, out=np.zeros_like(count), where=count > 0)
+        m2 = (np.where(mask, values - mean, 0.0) ** 2).sum(axis=0)
+        total = self.count + count
+        delta = mean - self.mean
+        ratio = np.divide(count, total, out=np.zeros_like(total), where=total > 0)
+        self.mean = self.mean + delta * ratio
+        self.m2 = self.m2 + m2 + delta ** 2 * self.count * ratio
+        self.count = total
+        self.min = np.minimum(self.min, np.where(mask, values, np.inf).min(axis=0))
+        self.max = np.maximum(self.max, np.where(mask, values, -np.inf).max(axis=0))
+
+        for i, digest in enumerate(self.digests):
+            digest.update(values[mask[:, i], i])
+
+        if self.shift is None:
+            self.shift = mean
+        shifted = np.where(mask, values - self.shift, 0.0)
+        present = mask.astype(float)
+        self.pair_count += present.T @ present
+        self.pair_sum += shifted.T @ present
+        self.pair_sum_sq += (shifted ** 2).T @ present
+        self.pair_cross += shifted.T @ shifted
+
+        self._update_monthly(df, values)
+
+    def _update_monthly(self, df: "pd.DataFrame", values: "np.ndarray") -> None:
+        frame = pd.DataFrame(values, columns=self.numeric_columns, index=df.index)
+        for date_column in self.date_columns:
+            months = pd.to_datetime(df[date_column], errors="coerce").dt.month
+            grouped = frame.groupby(months).agg(["sum", "count"])
+            previous = self.monthly.get(date_column)
+            self.monthly[date_column] = grouped if previous is None else previous.add(grouped, fill_value=0)
+
+    def describe(self) -> "pd.DataFrame":
+        """与 DataFrame.describe() 相同布局的统计表，追加数据后分位数来自 t-digest 估计"""
+        std = np.sqrt(np.divide(self.m2, self.count - 1, out=np.full_like(self.m2, np.nan), where=self.count > 1))
+        if self.quantiles is not None:
+            quartiles = self.quantiles.to_numpy()
+        else:
+            quartiles = np.array([digest.quantile([0.25, 0.5, 0.75]) for digest in self.digests]).reshape(-1, 3).T
+        empty = self.count == 0
+        summary = np.vstack([
+            self.count,
+            np.where(empty, np.nan, self.mean),
+            std,
+            np.where(empty, np.nan, self.min),
+            quartiles,
+            np.where(empty, np.nan, self.max),
+        ])
+        return pd.DataFrame(summary, index=["count", "mean", "std", "min", "25%", "50%", "75%", "max"], columns=self.numeric_columns)
+
+    def correlation(self) -> "pd.DataFrame":
+        """成对完整观测的 Pearson 相关系数矩阵，与 DataFrame.corr() 口径一致"""
+        n = self.pair_count
+        numerator = n * self.pair_cross - self.pair_sum * self.pair_sum.T
+        variance = n * self.pair_sum_sq - self.pair_sum ** 2
+        denominator = np.sqrt(np.clip(variance * variance.T, 0, None))
+        corr = np.divide(numerator, denominator, out=np.full_like(numerator, np.nan), where=denominator > 0)
+        return pd.DataFrame(np.clip(corr, -1, 1), index=self.numeric_columns, columns=self.numeric_columns)
+
+    def monthly_mean(self, date_column: str, numeric_column: str) -> "pd.DataFrame":
+        """按月份汇总的平均值，列为 ["月份", numeric_column]"""
+        grouped = self.monthly[date_column][numeric_column]
+        mean = (grouped["sum"] / grouped["count"].where(grouped["count"] > 0)).dropna()
+        mean.index = mean.index.astype(int)
+        return mean.rename_axis("月份").rename(numeric_column).reset_index()
+
+
+class ApproximateProfile(_ProfileBase):
+    """基于蓄水池样本和草图的近似概览统计，计算量与样本量有关而与数据总量无关
+
+    接口与 DatasetProfile 保持一致，另外提供各项指标的 95% 误差范围。
+    """
+
+    def __init__(self, columns, numeric_columns, date_columns, sample_size: int = APPROX_SAMPLE_SIZE, seed: int = 0):
+        super().__init__(columns, numeric_columns, date_columns)
+        self.sample_size = sample_size
+        self.rng = np.random.default_rng(seed)
+        self.sample = None
+        self.sketches = None
+        self._digests = None
+
+    @classmethod
+    def from_frame(cls, df: "pd.DataFrame", sample_size: int = APPROX_SAMPLE_SIZE) -> "ApproximateProfile":
+        profile = cls._from_schema(df, sample_size=sample_size)
+        profile.update(df)
+        return profile
+
+    def update(self, df: "pd.DataFrame") -> None:
+        """以蓄水池抽样（Algorithm R）并入新增数据，已有样本中的行按概率被替换"""
+        if df.empty:
+            return
+        self._count_nulls(df)
+        if self.sketches is not None:
+            for col, sketch in self.sketches.items():
+                sketch.update(df[col])
+
+        current = 0 if self.sample is None else len(self.sample)
+        fill = min(self.sample_size - current, len(df))
+        sample = df.iloc[:fill] if self.sample is None else pd.concat([self.sample, df.iloc[:fill]], ignore_index=True)
+        # 第 t 行（从 1 计数）以 k/t 的概率替换样本中的随机位置，同一位置多次命中时保留最后一次
+        seen = self.rows + fill + np.arange(1, len(df) - fill + 1)
+        slots = self.rng.integers(0, seen)
+        hit = np.flatnonzero(slots < self.sample_size)
+        if len(hit):
+            slots, last = np.unique(slots[hit][::-1], return_index=True)
+            sources = fill + hit[::-1][last]
+            sample = pd.concat([sample.drop(index=sample.index[slots]), df.iloc[sources]], ignore_index=True)
+        self.sample = sample.reset_index(drop=True)
+        self.rows += len(df)
+        self._digests = None
+
+    @property
+    def fraction(self) -> float:
+        return len(self.sample) / self.rows if self.rows else 1.0
+
+    def _sample_values(self) -> "pd.DataFrame":
+        return self.sample[self.numeric_columns].apply(pd.to_numeric, errors="coerce")
+
+    def _digest(self, col) -> TDigest:
+        if self._digests is None:
+            values = self._sample_values()
+            self._digests = {}
+            for name in self.numeric_columns:
+                digest = TDigest()
+                digest.update(values[name].dropna().to_numpy(dtype=float))
+                self._digests[name] = digest
+        return self._digests[col]
+
+    def describe(self) -> "pd.DataFrame":
+        """describe() 布局的估计值，count 按抽样比例放大"""
+        values = self._sample_values()
+        count = values.notna().sum() / self.fraction
+        rows = {
+            "count": count,
+            "mean": values.mean(),
+            "std": values.std(),
+            "min": values.min(),
+        }
+        for q, label in ((0.25, "25%"), (0.5, "50%"), (0.75, "75%")):
+            rows[label] = pd.Series({col: self._digest(col).quantile(q) for col in self.numeric_columns}, dtype=float)
+        rows["max"] = values.max()
+        return pd.DataFrame(rows).T[self.numeric_columns]
+
+    def describe_error(self) -> "pd.DataFrame":
+        """describe() 各项估计的 95% 误差半宽；min/max 取自样本，只给出估计值"""
+        values = self._sample_values()
+        n = values.notna().sum().astype(float)
+        # 有限总体校正：全量数据时误差为 0
+        correction = np.sqrt(max(1 - self.fraction, 0.0))
+        std = values.std()
+        p = n / len(self.sample) if len(self.sample) else n
+        rows = {
+            "count": Z_95 * np.sqrt(len(self.sample) * p * (1 - p)) / self.fraction * correction,
+            "mean": Z_95 * std / np.sqrt(n) * correction,
+            "std": Z_95 * std / np.sqrt(2 * (n - 1)) * correction,
+            "min": pd.Series(np.nan, index=self.numeric_columns),
+        }
+        for q, label in ((0.25, "25%"), (0.5, "50%"), (0.75, "75%")):
+            errors = {}
+            for col in self.numeric_columns:
+                digest = self._digest(col)
+                # DKW 不等式给出的抽样秩误差加上 t-digest 自身的秩误差，再换算为数值区间
+                rank = np.sqrt(np.log(2 / 0.05) / (2 * max(n[col], 1))) * correction + digest.rank_error(q)
+                low, high = digest.quantile([max(q - rank, 0), min(q + rank, 1)])
+                estimate = digest.quantile(q)
+                errors[col] = max(estimate - low, high - estimate)
+            rows[label] = pd.Series(errors, dtype=float)
+        rows["max"] = pd.Series(np.nan, index=self.numeric_columns)
+        return pd.DataFrame(rows).T[self.numeric_columns]
+
+    def correlation(self) -> "pd.DataFrame":
+        """样本上的 Pearson 相关系数"""
+        return self._sample_values().corr()
+
+    def correlation_error(self) -> "pd.DataFrame":
+        """相关系数 95% 置信区间的半宽（Fisher z 变换）"""
+        values = self._sample_values()
+        mask = values.notna().astype(float)
+        n = mask.T @ mask
+        corr = self.correlation().clip(-0.999999, 0.999999)
+        z = np.arctanh(corr)
+        spread = Z_95 / np.sqrt((n - 3).clip(lower=1))
+        correction = np.sqrt(max(1 - self.fraction, 0.0))
+        return ((np.tanh(z + spread) - np.tanh(z - spread)) / 2 * correction).where(n > 3)
+
+    def monthly_mean(self, date_column: str, numeric_column: str) -> "pd.DataFrame":
+        """基于样本的按月份平均值，列为 ["月份", numeric_column]"""
+        months = pd.to_datetime(self.sample[date_column], errors="coerce").dt.month.rename("月份")
+        mean = pd.to_numeric(self.sample[numeric_column], errors="coerce").groupby(months).mean().dropna()
+        mean.index = mean.index.astype(int)
+        return mean.reset_index()
+
+    def distinct(self, df: "pd.DataFrame") -> "pd.DataFrame":
+        """HyperLogLog 估计的各列唯一值数量；草图首次调用时基于全量数据构建，之后随追加增量更新"""
+        if self.sketches is None:
+            self.sketches = {}
+            for col in self.columns:
+                sketch = HyperLogLog()
+                sketch.update(df[col])
+                self.sketches[col] = sketch
+        estimates = pd.Series({col: sketch.estimate() for col, sketch in self.sketches.items()}, dtype=float)
+        errors = pd.Series({col: sketch.relative_error for col, sketch in self.sketches.items()}, dtype=float)
+        return pd.DataFrame({"唯一值估计": estimates.round(), "误差范围": (estimates * errors * Z_95).round()})
+
+
+# 异常值检测方法对应的标志位
+OUTLIER_METHODS = {"IQR": 1, "MAD": 2, "Z-score": 4}
+
+
+class OutlierReport:
+    """全部数值列的异常值检测结果
+
+    flags 为与原数据同索引的 int8 位掩码（IQR=1，MAD=2，Z-score=4），
+    summary 为各列各方法的异常值数量与占比，box_stats 为绘制箱线图所需的预计算统计量。
+    """
+
+    def __init__(self, flags: "pd.DataFrame", summary: "pd.DataFrame", box_stats: "pd.DataFrame"):
+        self.flags = flags
+        self.summary = summary
+        self.box_stats = box_stats
+        self._flagged = None
+
+    def outlier_values(self, df: "pd.DataFrame", column: str, method: str = "IQR", limit: int = 2000) -> "pd.Series":
+        """某列被指定方法标记的异常值，超过 limit 个时等距抽取以控制绘图数据量"""
+        values = df[column][(self.flags[column] & OUTLIER_METHODS[method]) > 0]
+        if len(values) > limit:
+            values = values.iloc[np.linspace(0, len(values) - 1, limit).astype(int)]
+        return values
+
+    def flagged_rows(self) -> "pd.DataFrame":
+        """至少被一种方法标记的行，每列给出命中的方法名称"""
+        labels = {
+            bits: "|".join(name for name, bit in OUTLIER_METHODS.items() if bits & bit)
+            for bits in range(1, sum(OUTLIER_METHODS.values()) + 1)
+        }
+        if self._flagged is None:
+            flagged = self.flags[(self.flags > 0).any(axis=1)]
+            self._flagged = flagged.apply(lambda col: col.map(labels).fillna("")).rename_axis("行号").reset_index()
+        return self._flagged
+
+
+def detect_outliers(df: "pd.DataFrame", numeric_columns, iqr_factor: float = 1.5, mad_threshold: float = 3.5, z_threshold: float = 3.0) -> OutlierReport:
+    """一次向量化计算所有数值列的 IQR、MAD 与 Z-score 异常值标记"""
+    numeric_columns = list(numeric_columns)
+    values = df[numeric_columns].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+    present = ~np.isnan(values)
+    count = present.sum(axis=0)
+    nonempty = count > 0
+    q1 = np.full(len(numeric_columns), np.nan)
+    median = q1.copy()
+    q3 = q1.copy()
+    mad = q1.copy()
+    if nonempty.any():
+        q1[nonempty], median[nonempty], q3[nonempty] = np.nanquantile(values[:, nonempty], [0.25, 0.5, 0.75], axis=0)
+        mad[nonempty] = np.nanmedian(np.abs(values[:, nonempty] - median[nonempty]), axis=0)
+    mean = np.divide(np.where(present, values, 0.0).sum(axis=0), count, out=np.full(len(count), np.nan), where=nonempty)
+    std = np.sqrt(np.divide((np.where(present, values - mean, 0.0) ** 2).sum(axis=0), count - 1, out=np.full(len(count), np.nan), where=count > 1))
+
+    lower = q1 - iqr_factor * (q3 - q1)
+    upper = q3 + iqr_factor * (q3 - q1)
+    iqr_flag = (values < lower) | (values > upper)
+    # MAD 为 0 或标准差为 0 时该方法不标记任何值（如多数取值相同的 0/1 列）
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mad_flag = (np.abs(0.6745 * (values - median) / mad) > mad_threshold) & (mad > 0)
+        z_flag = (np.abs((values - mean) / std) > z_threshold) & (std > 0)
+    bits = (
+        iqr_flag * np.int8(OUTLIER_METHODS["IQR"])
+        + mad_flag * np.int8(OUTLIER_METHODS["MAD"])
+        + z_flag * np.int8(OUTLIER_METHODS["Z-score"])
+    ).astype(np.int8)
+    flags = pd.DataFrame(bits, index=df.index, columns=numeric_columns)
+
+    summary = {"有效值": count}
+    for name, flag in (("IQR", iqr_flag), ("MAD", mad_flag), ("Z-score", z_flag), ("任一方法", bits > 0)):
+        flagged = flag.sum(axis=0)
+        summary[f"{name}异常数"] = flagged
+        summary[f"{name}占比"] = np.divide(flagged, count, out=np.zeros(len(count)), where=nonempty)
+    summary = pd.DataFrame(summary, index=numeric_columns)
+
+    box_stats = pd.DataFrame({
+        "q1": q1,
+        "median": median,
+        "q3": q3,
+        # 须线延伸到围栏内的最远数据点
+        "lowerfence": np.where(present & ~(values < lower), values, np.inf).min(axis=0),
+        "upperfence": np.where(present & ~(values > upper), values, -np.inf).max(axis=0),
+        "mean": mean,
+    }, index=numeric_columns).replace([np.inf, -np.inf], np.nan)
+    return OutlierReport(flags, summary, box_stats)
@@ -0,0 +1,226 @@
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+import pandas as pd
+
+import perf
+
+# 通过环境变量配置会话内存治理策略
+SESSION_MEMORY_LIMIT_MB = float(os.getenv("SESSION_MEMORY_LIMIT_MB", "2048"))
+PROCESS_MEMORY_LIMIT_MB = float(os.getenv("PROCESS_MEMORY_LIMIT_MB", "8192"))
+SESSION_IDLE_SECONDS = float(os.getenv("SESSION_IDLE_SECONDS", "900"))
+SESSION_EXPIRE_SECONDS = float(os.getenv("SESSION_EXPIRE_SECONDS", "86400"))
+SPILL_DIR = os.getenv("SPILL_DIR", os.path.join(tempfile.gettempdir(), "sjfx2_spill"))
+JANITOR_INTERVAL_SECONDS = 60
+
+MB = 1024 * 1024
+
+
+class _Entry:
+    __slots__ = ("frame", "path", "nbytes", "last_access", "spilling")
+
+    def __init__(self, frame: "pd.DataFrame", nbytes: int):
+        self.frame = frame
+        self.path = None
+        self.nbytes = nbytes
+        self.last_access = time.time()
+        self.spilling = False
+
+
+class SessionDataManager:
+    """按会话管理 DataFrame 的内存占用
+
+    闲置超时或内存超限的数据会写入本地列式缓存（Parquet，列名不全是字符串时用 pickle）并释放内存，下次访问时透明加载；
+    长期无人访问的会话数据会被彻底删除。落盘与清理只在后台线程中进行，文件读写都不持有锁，
+    某个会话的大文件写盘不会阻塞其他会话的访问。
+    """
+
+    def __init__(self, session_limit_mb: float, process_limit_mb: float, idle_seconds: float, expire_seconds: float, spill_dir: str):
+        self.session_limit = session_limit_mb * MB
+        self.process_limit = process_limit_mb * MB
+        self.idle_seconds = idle_seconds
+        self.expire_seconds = expire_seconds
+        self.spill_dir = spill_dir
+        self._entries = {}
+        self._lock = threading.RLock()
+        self._wake = threading.Event()
+        self._janitor = None
+
+    def put(self, session_id: str, key: str, df: "pd.DataFrame") -> None:
+        """保存会话数据，超过单会话上限时拒绝"""
+        nbytes = int(df.memory_usage(deep=True).sum())
+        if nbytes > self.session_limit:
+            raise ValueError(f"数据占用 {nbytes / MB:,.0f} MB 内存，超过单会话上限 {self.session_limit / MB:,.0f} MB")
+        with self._lock:
+            self._remove((session_id, key))
+            self._entries[(session_id, key)] = _Entry(df, nbytes)
+            over_budget = self._over_budget(session_id)
+        if over_budget:
+            self._wake.set()
+
+    def get(self, session_id: str, key: str) -> "pd.DataFrame":
+        """读取会话数据，已落盘的数据会重新加载到内存"""
+        with self._lock:
+            entry = self._entries[(session_id, key)]
+            entry.last_access = time.time()
+            frame, path = entry.frame, entry.path
+        if frame is not None:
+            return frame
+        with perf.span("session.reload"):
+            frame = self._load(path)
+        with self._lock:
+            if self._entries.get((session_id, key)) is entry and entry.frame is None:
+                entry.frame = frame
+            over_budget = self._over_budget(session_id)
+        if over_budget:
+            self._wake.set()
+        return frame
+
+    def contains(self, session_id: str, key: str) -> bool:
+        with self._lock:
+            return (session_id, key) in self._entries
+
+    def discard(self, session_id: str, key: str) -> None:
+        with self._lock:
+            self._remove((session_id, key))
+
+    def start_janitor(self) -> None:
+        """启动后台线程，定期（或内存超限时立即）落盘闲置和超限的数据，使已关闭的标签页不再占用内存"""
+        with self._lock:
+            if self._janitor is not None:
+                return
+            self._janitor = threading.Thread(target=self._run_janitor, name="session-janitor", daemon=True)
+            self._janitor.start()
+
+    def _run_janitor(self) -> None:
+        while True:
+            self._wake.wait(JANITOR_INTERVAL_SECONDS)
+            self._wake.clear()
+            self.sweep()
+
+    def sweep(self) -> None:
+        """删除过期数据，并将闲置或超出内存上限的数据落盘"""
+        with self._lock:
+            victims = self._select_spills()
+        for entry_key, entry, marked_at in victims:
+            self._spill(entry_key, entry, marked_at)
+
+    def summary(self) -> list:
+        """各会话的内存与落盘占用"""
+        now = time.time()
+        sessions = {}
+        with self._lock:
+            for (session_id, _), entry in self._entries.items():
+                row = sessions.setdefault(session_id, {"会话": session_id, "内存占用(MB)": 0.0, "已落盘(MB)": 0.0, "闲置秒数": now})
+                row["内存占用(MB)" if entry.frame is not None else "已落盘(MB)"] += round(entry.nbytes / MB, 1)
+                row["闲置秒数"] = min(row["闲置秒数"], round(now - entry.last_access))
+        return sorted(sessions.values(), key=lambda row: row["闲置秒数"])
+
+    def _over_budget(self, session_id: str) -> bool:
+        # 调用方需持有 self._lock
+        session_bytes = total = 0
+        for (owner, _), entry in self._entries.items():
+            if entry.frame is not None and not entry.spilling:
+                total += entry.nbytes
+                if owner == session_id:
+                    session_bytes += entry.nbytes
+        return session_bytes > self.session_limit or total > self.process_limit
+
+    def _remove(self, entry_key: tuple) -> None:
+        entry = self._entries.pop(entry_key, None)
+        if entry is not None and entry.path is not None and os.path.exists(entry.path):
+            os.remove(entry.path)
+
+    def _write(self, frame: "pd.DataFrame") -> str:
+        os.makedirs(self.spill_dir, exist_ok=True)
+        path = os.path.join(self.spill_dir, uuid.uuid4().hex)
+        # Parquet 会把非字符串的列名/索引名（如年份表头 2022）转成字符串，读回后列名对不上，这类数据直接用 pickle
+        labels = list(frame.columns) + [name for name in frame.index.names if name is not None]
+        if all(isinstance(label, str) for label in labels):
+            try:
+                frame.to_parquet(path + ".parquet")
+                return path + ".parquet"
+            except (ImportError, ValueError, TypeError, NotImplementedError):
+                # Arrow 无法表示的列（如混合类型的 object 列）退回 pickle
+                if os.path.exists(path + ".parquet"):
+                    os.remove(path + ".parquet")
+        frame.to_pickle(path + ".pkl")
+        return path + ".pkl"
+
+    def _spill(self, entry_key: tuple, entry: _Entry, marked_at: float) -> None:
+        # 数据未变化时复用已有的缓存文件，避免重复写盘；写盘期间不持有锁
+        path = entry.path
+        written = path is None
+        if written:
+            with perf.span("session.spill"):
+                path = self._write(entry.frame)
+        with self._lock:
+            entry.spilling = False
+            if self._entries.get(entry_key) is not entry:
+                # 写盘期间数据已被替换或删除
+                if written and os.path.exists(path):
+                    os.remove(path)
+                return
+            entry.path = path
+            # 写盘期间又被访问的数据保留在内存中，缓存文件留待下次落盘时复用
+            if entry.last_access <= marked_at:
+                entry.frame = None
+
+    @staticmethod
+    def _load(path: str) -> "pd.DataFrame":
+        if path.endswith(".parquet"):
+            return pd.read_parquet(path)
+        return pd.read_pickle(path)
+
+    def _select_spills(self) -> list:
+        # 调用方需持有 self._lock：删除过期数据并挑选需要落盘的数据，实际写盘在锁外进行
+        now = time.time()
+        victims = {}
+        expired = set()
+        for entry_key, entry in list(self._entries.items()):
+            if now - entry.last_access > self.expire_seconds:
+                self._remove(entry_key)
+                expired.add(entry_key[0])
+            elif entry.frame is not None and not entry.spilling and now - entry.last_access > self.idle_seconds:
+                victims[entry_key] = entry
+        # 数据全部过期的会话视为已结束，一并丢弃它的埋点聚合统计
+        for session_id in expired - {owner for owner, _ in self._entries}:
+            perf.forget_session(session_id)
+
+        resident = sorted(
+            ((key, entry) for key, entry in self._entries.items() if entry.frame is not None and not entry.spilling and key not in victims),
+            key=lambda item: item[1].last_access,
+            reverse=True,
+        )
+        # 单会话超限：保留最近访问的数据，其余落盘
+        per_session = {}
+        for (session_id, name), entry in resident:
+            per_session[session_id] = per_session.get(session_id, 0) + entry.nbytes
+            if per_session[session_id] > self.session_limit:
+                victims[(session_id, name)] = entry
+                per_session[session_id] -= entry.nbytes
+
+        # 进程超限：按最近最少使用顺序落盘
+        total = sum(entry.nbytes for key, entry in resident if key not in victims)
+        for key, entry in reversed(resident):
+            if total <= self.process_limit:
+                break
+            if key not in victims:
+                victims[key] = entry
+                total -= entry.nbytes
+
+        for entry in victims.values():
+            entry.spilling = True
+        return [(key, entry, now) for key, entry in victims.items()]
+
+
+data_manager = SessionDataManager(
+    SESSION_MEMORY_LIMIT_MB,
+    PROCESS_MEMORY_LIMIT_MB,
+    SESSION_IDLE_SECONDS,
+    SESSION_EXPIRE_SECONDS,
+    SPILL_DIR,
+)
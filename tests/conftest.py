@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 各模块位于仓库根目录，直接运行 pytest 时也能导入
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,64 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import batch
+
+
+def _fake_agent(df, query, history=None):
+    if "表格" in query:
+        return {"table": {"columns": ["地区", "合计"], "data": [["华东", 10], ["华北", 5]]}}
+    return {"answer": f"共 {len(df)} 行"}
+
+
+@pytest.fixture
+def agent(monkeypatch):
+    monkeypatch.setattr(batch, "dataframe_agent", _fake_agent)
+
+
+def _read_report(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_report_with_year_headers(tmp_path, agent):
+    # Excel 中的年份表头读取后为整数列名，与文字列名混在一起
+    rng = np.random.default_rng(0)
+    source = pd.DataFrame({"地区": [f"区域{i}" for i in range(30)], "销量": rng.integers(1, 50, 30), 2022: rng.normal(100, 10, 30), 2023: rng.normal(120, 10, 30)})
+    path = tmp_path / "sales.xlsx"
+    source.to_excel(path, index=False)
+
+    [report_path] = batch.run_batch([str(path)], ["汇总", "各地区表格"], str(tmp_path / "out"), workers=2)
+    report = _read_report(report_path)
+    assert "error" not in report
+    assert report["rows"] == 30
+    assert report["numeric_columns"] == 3
+    assert [answer["result"] for answer in report["answers"]] == [_fake_agent(source, "汇总"), _fake_agent(source, "各地区表格")]
+
+    out = tmp_path / "out" / "sales"
+    describe = pd.read_parquet(out / "describe.parquet")
+    assert list(describe.columns) == ["销量", "2022", "2023"]
+    assert describe.loc["mean", "2022"] == pytest.approx(source[2022].mean())
+    correlation = pd.read_parquet(out / "correlation.parquet")
+    assert correlation.loc["2022", "2023"] == pytest.approx(source[2022].corr(source[2023]))
+    answer = pd.read_parquet(out / "answer_2.parquet")
+    assert answer.to_dict("list") == {"地区": ["华东", "华北"], "合计": [10, 5]}
+    assert not (out / "answer_1.parquet").exists()
+
+
+def test_failed_file_is_recorded_and_others_continue(tmp_path, agent):
+    broken = tmp_path / "broken.csv"
+    broken.write_text("", encoding="utf-8")
+    good = tmp_path / "good.csv"
+    pd.DataFrame({"产品": ["A", "B", "C"], "销量": [1, 2, 3]}).to_csv(good, index=False)
+
+    broken_path, good_path = batch.run_batch([str(broken), str(good)], ["汇总"], str(tmp_path / "out"))
+    failed = _read_report(broken_path)
+    assert failed["source"] == str(broken)
+    assert "EmptyDataError" in failed["error"]
+    report = _read_report(good_path)
+    assert "error" not in report
+    assert report["rows"] == 3
+    assert report["answers"] == [{"question": "汇总", "result": {"answer": "共 3 行"}}]
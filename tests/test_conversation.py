@@ -0,0 +1,71 @@
+import pandas as pd
+import pytest
+
+from conversation import Conversation, frame_result
+
+
+@pytest.fixture
+def conversation():
+    conversation = Conversation()
+    conversation.add("各年份各产品销售额", {"table": {
+        "columns": ["年份", "产品", "销售额"],
+        "data": [[2022, "a", 10], [2023, "b", 20], [2023, "c", 5], [2024, "a", 7]],
+    }}, "llm")
+    return conversation
+
+
+@pytest.mark.parametrize("query", [
+    "画出各地区销量的柱状图",
+    "前3季度的利润是多少",
+    "online sales",
+    "只看2023年和2024年",
+    "为什么2023年下降了",
+])
+def test_new_questions_go_to_the_model(conversation, query):
+    assert conversation.refine_locally(query) is None
+
+
+def test_year_filter(conversation):
+    for query in ("只看2023年的数据", "now only for 2023"):
+        result = conversation.refine_locally(query)
+        assert [row[0] for row in result["table"]["data"]] == [2023, 2023]
+
+
+def test_top_n_and_chart_switch(conversation):
+    assert len(conversation.refine_locally("前2项")["table"]["data"]) == 2
+    assert "line" in conversation.refine_locally("改成折线图")
+    assert "line" in conversation.refine_locally("show as a line chart")
+    assert "pie" in conversation.refine_locally("只看2023年，改成饼图")
+
+
+def test_history_is_bounded_and_summarized():
+    conversation = Conversation()
+    evicted = [turn["id"] for i in range(30) for turn in conversation.add(f"问题{i}", {"answer": f"回答{i}"}, "llm")]
+    assert len(conversation.turns) == 20
+    # 超出上限的轮次按顺序返回，供调用方释放界面缓存
+    assert evicted == list(range(10))
+    messages = conversation.context_messages()
+    assert messages[0]["role"] == "system"
+    assert [m["content"] for m in messages if m["role"] == "user"] == ["问题27", "问题28", "问题29"]
+
+
+def test_chart_uses_year_as_axis_not_series(conversation):
+    chart = conversation.refine_locally("改成折线图")["line"]
+    assert chart["columns"] == ["2022", "2023", "2023", "2024"]
+    assert chart["data"] == [10, 20, 5, 7]
+    top = conversation.refine_locally("前1项")["table"]["data"]
+    assert top == [[2023, "b", 20]]
+
+
+def test_frame_result_prefers_date_axis_and_keeps_value_series():
+    frame = pd.DataFrame({
+        "地区": ["华东", "华北"],
+        "日期": pd.to_datetime(["2023-01-01", "2023-02-01"]),
+        "产品编号": [101, 102],
+        "销量": [1.5, 2.0],
+        "利润": [0.5, 0.8],
+    })
+    chart = frame_result(frame, "bar")["bar"]
+    assert chart["columns"] == ["2023-01-01", "2023-02-01"]
+    assert chart["series"] == ["销量", "利润"]
+    assert frame_result(frame[["地区", "产品编号"]], "bar") is None
@@ -0,0 +1,72 @@
+import threading
+import tracemalloc
+
+import numpy as np
+
+import perf
+
+
+def _peak(name: str) -> float:
+    return next(row["mem_peak_mb"] for row in perf.process_summary() if row["span"] == name)
+
+
+def test_nested_span_keeps_outer_peak(monkeypatch):
+    monkeypatch.setattr(perf, "TRACE_MEMORY", True)
+    with perf.span("test.outer"):
+        block = np.ones(10_000_000)  # 约 76 MB
+        del block
+        with perf.span("test.inner"):
+            np.ones(1000)
+    assert _peak("test.outer") > 70
+    assert _peak("test.inner") < 1
+    assert not tracemalloc.is_tracing()
+
+
+def test_concurrent_spans_do_not_stop_tracing(monkeypatch):
+    monkeypatch.setattr(perf, "TRACE_MEMORY", True)
+    entered = threading.Event()
+    release = threading.Event()
+
+    def worker():
+        with perf.span("test.worker"):
+            entered.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    entered.wait(5)
+    with perf.span("test.short"):
+        pass
+    # 其他线程的代码块仍在进行，跟踪不能被关闭
+    assert tracemalloc.is_tracing()
+    release.set()
+    thread.join()
+    assert not tracemalloc.is_tracing()
+
+
+def test_session_aggregates_are_bounded(monkeypatch):
+    monkeypatch.setattr(perf, "SESSION_LIMIT", 3)
+    monkeypatch.setattr(perf, "_session_stats", perf.OrderedDict())
+    monkeypatch.setattr(perf, "_session_usage", perf.OrderedDict())
+    for session_id in ("a", "b", "c"):
+        perf.bind_session(session_id)
+        with perf.span("test.bounded"):
+            pass
+        perf.record_llm_usage(10, 5, 0, 0.1, 100)
+    # 再次活动的会话不会被优先淘汰
+    perf.bind_session("a")
+    with perf.span("test.bounded"):
+        pass
+    perf.bind_session("d")
+    with perf.span("test.bounded"):
+        pass
+    perf.record_llm_usage(10, 5, 0, 0.1, 100)
+    perf.bind_session("-")
+    assert list(perf._session_stats) == ["c", "a", "d"]
+    assert list(perf._session_usage) == ["b", "c", "d"]
+    assert perf.session_summary("b") == []
+    assert "sjfx_tracked_sessions 3" in perf.export_prometheus()
+
+    perf.forget_session("a")
+    assert perf.session_summary("a") == []
+    assert perf.llm_usage("a")["calls"] == 0
@@ -0,0 +1,195 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from profiling import OUTLIER_METHODS, ApproximateProfile, DatasetProfile, HyperLogLog, TDigest, detect_outliers
+
+
+def _frame(rows: int, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "日期": pd.date_range("2023-01-01", periods=rows, freq="h") + pd.Timedelta(days=seed * 40),
+        "销量": rng.normal(1e6, 5, rows),  # 大均值小方差，检验平移求和的数值稳定性
+        "价格": rng.exponential(10, rows),
+        "类别": rng.choice(list("abc"), rows),
+    })
+    df["利润"] = df["价格"] * 0.3 + rng.normal(0, 1, rows)
+    df.loc[rng.random(rows) < 0.1, "价格"] = np.nan
+    return df
+
+
+@pytest.fixture
+def batches():
+    return [_frame(3000, 0), _frame(500, 1), _frame(1, 2), _frame(2000, 3)]
+
+
+def test_exact_profile_matches_pandas(batches):
+    df = batches[0]
+    profile = DatasetProfile.from_frame(df)
+    pd.testing.assert_frame_equal(profile.describe(), df[profile.numeric_columns].describe(), rtol=1e-9)
+    pd.testing.assert_frame_equal(profile.correlation(), df[profile.numeric_columns].corr(), rtol=1e-7)
+
+
+def test_profile_after_appends_matches_pandas(batches):
+    profile = DatasetProfile.from_frame(batches[0])
+    for batch in batches[1:]:
+        profile.update(profile.conform(batch))
+    full = pd.concat(batches, ignore_index=True)
+    expected = full[profile.numeric_columns].describe()
+    actual = profile.describe()
+
+    assert profile.rows == len(full)
+    assert profile.missing == int(full.isna().sum().sum())
+    exact_rows = ["count", "mean", "std", "min", "max"]
+    pd.testing.assert_frame_equal(actual.loc[exact_rows], expected.loc[exact_rows], rtol=1e-9)
+    # 追加后分位数来自 t-digest：按秩误差检查
+    for col in profile.numeric_columns:
+        values = full[col].dropna()
+        for label, q in (("25%", 0.25), ("50%", 0.5), ("75%", 0.75)):
+            rank = (values < actual.loc[label, col]).mean()
+            assert abs(rank - q) < 0.01
+    pd.testing.assert_frame_equal(profile.correlation(), full[profile.numeric_columns].corr(), rtol=1e-7)
+
+
+def test_monthly_mean_after_appends(batches):
+    profile = DatasetProfile.from_frame(batches[0])
+    for batch in batches[1:]:
+        profile.update(batch)
+    full = pd.concat(batches, ignore_index=True)
+    expected = full.groupby(full["日期"].dt.month)["价格"].mean().dropna()
+    actual = profile.monthly_mean("日期", "价格").set_index("月份")["价格"]
+    np.testing.assert_allclose(actual.to_numpy(), expected.to_numpy(), rtol=1e-9)
+    assert list(actual.index) == list(expected.index)
+
+
+def test_conform_rejects_missing_columns(batches):
+    profile = DatasetProfile.from_frame(batches[0])
+    with pytest.raises(ValueError):
+        profile.conform(batches[1].drop(columns=["价格"]))
+    converted = profile.conform(batches[1].astype({"销量": str}))
+    assert pd.api.types.is_numeric_dtype(converted["销量"])
+
+
+def _ids(start: int, stop: int) -> pd.DataFrame:
+    return pd.DataFrame({"id": np.arange(start, stop), "值": np.arange(start, stop, dtype=float)})
+
+
+def test_reservoir_size_and_uniqueness():
+    profile = ApproximateProfile.from_frame(_ids(0, 30), sample_size=100)
+    assert len(profile.sample) == 30 and profile.fraction == 1.0
+    for start, stop in ((30, 90), (90, 95), (95, 1000), (1000, 5000)):
+        profile.update(_ids(start, stop))
+        assert len(profile.sample) == min(100, stop)
+        assert profile.sample["id"].is_unique
+        assert profile.sample["id"].between(0, stop - 1).all()
+    assert profile.rows == 5000
+
+
+def test_reservoir_is_uniform_across_batches():
+    rows, size, runs = 1000, 100, 400
+    hits = np.zeros(rows)
+    for seed in range(runs):
+        profile = ApproximateProfile(["id", "值"], ["id", "值"], [], sample_size=size, seed=seed)
+        for start, stop in ((0, 50), (50, 300), (300, 301), (301, rows)):
+            profile.update(_ids(start, stop))
+        hits[profile.sample["id"].to_numpy()] += 1
+    # 每行被抽中的概率均为 size / rows，按 10 段汇总后检查偏差
+    expected = runs * size / rows
+    segments = hits.reshape(10, -1).mean(axis=1)
+    assert np.all(np.abs(segments - expected) < 0.15 * expected)
+
+
+def test_tdigest_quantiles_and_merge():
+    rng = np.random.default_rng(0)
+    values = rng.lognormal(0, 1, 200_000)
+    left, right = TDigest(), TDigest()
+    left.update(values[:120_000])
+    right.update(values[120_000:])
+    left.merge(right)
+    assert left.count == len(values)
+    for q in (0.01, 0.25, 0.5, 0.75, 0.99):
+        rank = (values < left.quantile(q)).mean()
+        assert abs(rank - q) < 0.005
+
+
+def test_hyperloglog_estimate_and_merge():
+    first, second = HyperLogLog(), HyperLogLog()
+    first.update(pd.Series(np.arange(0, 60_000)))
+    second.update(pd.Series(np.arange(40_000, 100_000).astype(str)))
+    assert abs(first.estimate() - 60_000) < 4 * first.relative_error * 60_000
+    # 合并后为并集的基数（整数与字符串分别计数）
+    first.merge(second)
+    assert abs(first.estimate() - 120_000) < 4 * first.relative_error * 120_000
+    small = HyperLogLog()
+    small.update(pd.Series(["a", "b", "c", "a"]))
+    assert round(small.estimate()) == 3
+
+
+def test_approximate_profile_against_pandas(batches):
+    full = pd.concat(batches, ignore_index=True)
+    numeric = ["销量", "价格", "利润"]
+    # 样本覆盖全部数据时估计值应与精确值一致，误差为 0
+    exact = ApproximateProfile.from_frame(batches[0], sample_size=10_000)
+    for batch in batches[1:]:
+        exact.update(batch)
+    assert exact.fraction == 1.0
+    np.testing.assert_allclose(exact.describe().loc[["count", "mean", "std"]], full[numeric].describe().loc[["count", "mean", "std"]], rtol=1e-9)
+    assert (exact.describe_error().loc[["count", "mean", "std"]] == 0).all().all()
+    np.testing.assert_allclose(exact.correlation(), full[numeric].corr(), rtol=1e-9)
+
+    sampled = ApproximateProfile.from_frame(batches[0], sample_size=1000)
+    for batch in batches[1:]:
+        sampled.update(batch)
+    estimate, error = sampled.describe(), sampled.describe_error()
+    truth = full[numeric].describe()
+    # 95% 区间：放宽到 2 倍半宽以避免偶发失败
+    for row in ("count", "mean", "50%"):
+        assert (np.abs(estimate.loc[row] - truth.loc[row]) <= 2 * error.loc[row]).all()
+
+
+def _reference_flags(series: pd.Series) -> dict:
+    values = series.dropna()
+    q1, q3 = values.quantile([0.25, 0.75])
+    median = values.median()
+    mad = (values - median).abs().median()
+    std = values.std()
+    flags = {
+        "IQR": (series < q1 - 1.5 * (q3 - q1)) | (series > q3 + 1.5 * (q3 - q1)),
+        "MAD": (0.6745 * (series - median) / mad).abs() > 3.5 if mad > 0 else pd.Series(False, index=series.index),
+        "Z-score": ((series - series.mean()) / std).abs() > 3 if std > 0 else pd.Series(False, index=series.index),
+    }
+    return {name: flag.fillna(False) for name, flag in flags.items()}
+
+
+def test_outlier_bitmask_matches_reference():
+    rng = np.random.default_rng(1)
+    df = pd.DataFrame({
+        "正态": np.append(rng.normal(0, 1, 995), [8, -9, 12, 30, np.nan]),
+        "偏态": rng.lognormal(0, 1, 1000),
+        "文本数字": rng.integers(0, 100, 1000).astype(str),
+    }, index=np.arange(1000) * 3)
+    report = detect_outliers(df, df.columns)
+    for col in df.columns:
+        reference = _reference_flags(pd.to_numeric(df[col], errors="coerce"))
+        for name, bit in OUTLIER_METHODS.items():
+            actual = (report.flags[col] & bit) > 0
+            pd.testing.assert_series_equal(actual, reference[name], check_names=False)
+            assert report.summary.loc[col, f"{name}异常数"] == reference[name].sum()
+    flagged = report.flagged_rows()
+    assert set(flagged["行号"]) == set(report.flags.index[(report.flags > 0).any(axis=1)])
+
+
+def test_constant_majority_column_has_no_mad_outliers():
+    # 60% 为 0 的 0/1 列：MAD 为 0，不应把所有 1 标记为异常
+    df = pd.DataFrame({"标记": [0] * 60 + [1] * 40, "常数": [5.0] * 100})
+    report = detect_outliers(df, df.columns)
+    assert report.summary.loc["标记", "MAD异常数"] == 0
+    assert report.summary.loc["常数", "任一方法异常数"] == 0
+    assert (report.flags == 0).all().all()
+
+
+def test_outliers_on_empty_column():
+    df = pd.DataFrame({"空": [np.nan] * 10, "值": np.arange(10.0)})
+    report = detect_outliers(df, df.columns)
+    assert report.summary.loc["空", "有效值"] == 0
+    assert report.summary.loc["空", "任一方法异常数"] == 0
@@ -0,0 +1,121 @@
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import perf
+from session_store import MB, SessionDataManager
+
+
+def _manager(tmp_path, session_mb=64, process_mb=64, idle=900, expire=86400):
+    return SessionDataManager(session_mb, process_mb, idle, expire, str(tmp_path))
+
+
+def _frame(mb: float) -> pd.DataFrame:
+    return pd.DataFrame({"值": np.arange(int(mb * MB / 8), dtype=float)})
+
+
+def _resident(manager) -> set:
+    return {key for key, entry in manager._entries.items() if entry.frame is not None}
+
+
+def test_put_rejects_frames_over_session_limit(tmp_path):
+    manager = _manager(tmp_path, session_mb=1)
+    with pytest.raises(ValueError):
+        manager.put("s", "df", _frame(2))
+
+
+def test_idle_spill_and_transparent_reload(tmp_path):
+    manager = _manager(tmp_path, idle=0)
+    df = _frame(1)
+    manager.put("s", "df", df)
+    # 请求路径不落盘，只由 sweep（后台线程）处理
+    assert _resident(manager) == {("s", "df")}
+    manager.sweep()
+    assert _resident(manager) == set()
+    pd.testing.assert_frame_equal(manager.get("s", "df"), df)
+    assert _resident(manager) == {("s", "df")}
+
+
+def test_spill_keeps_non_string_column_labels(tmp_path):
+    manager = _manager(tmp_path, idle=0)
+    df = pd.DataFrame({"地区": ["华东", "华北", "华南"], 2022: [1.5, 2.5, 3.5], 2023: [4, 5, 6]})
+    manager.put("s", "df", df)
+    manager.sweep()
+    assert _resident(manager) == set()
+    reloaded = manager.get("s", "df")
+    pd.testing.assert_frame_equal(reloaded, df)
+    assert reloaded[2022].tolist() == [1.5, 2.5, 3.5]
+
+
+def test_process_limit_spills_least_recently_used(tmp_path):
+    manager = _manager(tmp_path, session_mb=8, process_mb=5)
+    for session_id in ("a", "b", "c"):
+        manager.put(session_id, "df", _frame(2))
+        time.sleep(0.01)
+    manager.get("a", "df")
+    manager.sweep()
+    assert _resident(manager) == {("a", "df"), ("c", "df")}
+
+
+def test_expired_entries_are_removed(tmp_path):
+    manager = _manager(tmp_path, idle=0, expire=0)
+    manager.put("s", "df", _frame(0.1))
+    time.sleep(0.01)
+    manager.sweep()
+    assert not manager.contains("s", "df")
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_expired_session_drops_perf_aggregates(tmp_path):
+    manager = _manager(tmp_path, idle=0, expire=0)
+    perf.bind_session("expired")
+    with perf.span("test.expired"):
+        manager.put("expired", "df", _frame(0.1))
+    perf.bind_session("-")
+    assert perf.session_summary("expired")
+    time.sleep(0.01)
+    manager.sweep()
+    assert perf.session_summary("expired") == []
+
+
+def test_spill_write_does_not_block_other_sessions(tmp_path):
+    manager = _manager(tmp_path, idle=0)
+    manager.put("slow", "df", _frame(1))
+    started, release = threading.Event(), threading.Event()
+    write = manager._write
+
+    def blocking_write(frame):
+        started.set()
+        release.wait(5)
+        return write(frame)
+
+    manager._write = blocking_write
+    sweeper = threading.Thread(target=manager.sweep)
+    sweeper.start()
+    assert started.wait(5)
+    # 写盘进行中，其他会话的读写不应等待
+    begin = time.perf_counter()
+    manager.put("other", "df", _frame(0.1))
+    manager.get("other", "df")
+    assert time.perf_counter() - begin < 1
+    release.set()
+    sweeper.join()
+
+
+def test_replaced_during_spill_discards_written_file(tmp_path):
+    manager = _manager(tmp_path, idle=0)
+    manager.put("s", "df", _frame(0.1))
+    write = manager._write
+
+    def replacing_write(frame):
+        path = write(frame)
+        manager.put("s", "df", _frame(0.2))
+        return path
+
+    manager._write = replacing_write
+    manager.sweep()
+    assert len(manager.get("s", "df")) == len(_frame(0.2))
+    assert list(tmp_path.iterdir()) == []
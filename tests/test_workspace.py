@@ -0,0 +1,120 @@
+import uuid
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from session_store import data_manager
+from workspace import Workspace
+
+
+@pytest.fixture
+def workspace():
+    return Workspace(uuid.uuid4().hex)
+
+
+def test_deltas_are_tracked_per_dataset(workspace):
+    orders = pd.DataFrame({"订单": range(5), "产品": list("abcab")})
+    workspace.load("orders", ("o", None), lambda: orders)
+    workspace.load("products", ("p", None), lambda: pd.DataFrame({"产品": list("abc")}))
+    signature = workspace.signature("orders")
+
+    workspace.update("orders", pd.concat([orders, orders.head(2)], ignore_index=True), "delta-1")
+    assert workspace.applied_deltas("orders") == ["delta-1"]
+    assert workspace.applied_deltas("products") == []
+    # 追加数据不改变数据集标识，增量统计量可以继续使用
+    assert workspace.signature("orders") == signature
+    joined = workspace.add_join("orders", "products", "产品", "产品")
+    with pytest.raises(ValueError):
+        workspace.update(joined, orders)
+
+
+def test_reload_after_expiry_resets_deltas_and_signature(workspace):
+    orders = pd.DataFrame({"订单": range(5)})
+    workspace.load("orders", ("o", None), lambda: orders)
+    workspace.update("orders", pd.concat([orders, orders], ignore_index=True), "delta-1")
+    signature = workspace.signature("orders")
+
+    # 来源未变且数据仍在时不重复解析
+    assert not workspace.load("orders", ("o", None), lambda: orders)
+    data_manager.discard(workspace.session_id, "dataset:orders")
+    assert workspace.load("orders", ("o", None), lambda: orders)
+    assert len(workspace.get("orders")) == 5
+    assert workspace.applied_deltas("orders") == []
+    assert workspace.signature("orders") != signature
+
+
+@pytest.fixture
+def tables(workspace):
+    rng = np.random.default_rng(0)
+    orders = pd.DataFrame({
+        "订单": np.arange(2000),
+        "产品": rng.choice(["p1", "p2", "p3", "p9", None], 2000),
+        "数量": rng.integers(1, 10, 2000),
+    }, index=np.arange(2000) * 2)
+    products = pd.DataFrame({"编号": ["p1", "p2", "p3", "p4"], "价格": [1.5, 2.0, 3.0, 4.0], "数量": [7, 8, 9, 10]})
+    tags = pd.DataFrame({"产品": ["p1", "p1", "p2", None, "p4"], "标签": ["新", "热销", "促销", "无", "旧"]})
+    for name, frame in (("orders", orders), ("products", products), ("tags", tags)):
+        workspace.load(name, (name, None), lambda frame=frame: frame)
+    return orders, products, tags
+
+
+def _normalize(frame: pd.DataFrame) -> pd.DataFrame:
+    frame = frame.reset_index(drop=True)
+    return frame.sort_values(list(frame.columns), kind="stable").reset_index(drop=True)
+
+
+@pytest.mark.parametrize("how", ["left", "inner"])
+def test_unique_key_lookup_matches_merge(workspace, tables, how):
+    orders, products, _ = tables
+    joined = workspace.get(workspace.add_join("orders", "products", "产品", "编号", how))
+    expected = orders.merge(products.rename(columns={"数量": "数量_products"}), left_on="产品", right_on="编号", how=how)
+    pd.testing.assert_frame_equal(joined, expected.reset_index(drop=True), check_dtype=False)
+
+
+@pytest.mark.parametrize("how", ["left", "inner"])
+def test_one_to_many_join_matches_merge(workspace, tables, how):
+    orders, _, tags = tables
+    joined = workspace.get(workspace.add_join("orders", "tags", "产品", "产品", how))
+    # pandas 会把两侧的空值键互相匹配，关联时空值不参与匹配
+    expected = orders.merge(tags.dropna(subset=["产品"]), on="产品", how=how)
+    pd.testing.assert_frame_equal(_normalize(joined), _normalize(expected), check_dtype=False)
+
+
+def test_join_is_cached_until_an_input_changes(workspace, tables):
+    orders, products, _ = tables
+    name = workspace.add_join("orders", "products", "产品", "编号")
+    first = workspace.get(name)
+    assert workspace.get(name) is first
+
+    # 关联列编码由会话数据管理器保存，数据集修改后旧编码随即释放
+    _, uniques = workspace.key_codes("products", "编号")
+    assert data_manager.contains(workspace.session_id, "codes:products:编号")
+    workspace.update("products", pd.concat([products, pd.DataFrame({"编号": ["p9"], "价格": [9.0], "数量": [1]})], ignore_index=True))
+    assert not data_manager.contains(workspace.session_id, "codes:products:编号")
+    rebuilt = workspace.get(name)
+    assert rebuilt is not first
+    assert len(workspace.key_codes("products", "编号")[1]) == len(uniques) + 1
+    assert (rebuilt.loc[rebuilt["产品"] == "p9", "价格"] == 9.0).all()
+
+
+def test_joins_on_different_keys_do_not_replace_each_other(workspace, tables):
+    orders, products, _ = tables
+    by_product = workspace.add_join("orders", "products", "产品", "编号")
+    by_quantity = workspace.add_join("orders", "products", "数量", "数量")
+    inner = workspace.add_join("orders", "products", "产品", "编号", "inner")
+    assert set(workspace.joins) == {by_product, by_quantity, inner}
+    assert len(workspace.joins) == 3
+    expected = orders.merge(products, on="数量", how="left", suffixes=("", "_products"))
+    pd.testing.assert_frame_equal(workspace.get(by_quantity), expected.reset_index(drop=True), check_dtype=False)
+    assert len(workspace.get(inner)) < len(workspace.get(by_product))
+
+
+def test_retain_drops_dependent_joins(workspace, tables):
+    name = workspace.add_join("orders", "products", "产品", "编号")
+    workspace.active = name
+    workspace.retain(["orders", "tags"])
+    assert name not in workspace.names
+    assert workspace.active is None
+    assert not data_manager.contains(workspace.session_id, f"join:{name}")
+    assert not data_manager.contains(workspace.session_id, "codes:products:编号")
@@ -1,7 +1,14 @@
+import io
 import json
+import logging
 from dotenv import load_dotenv
 import openai
+import openpyxl
 import os
+import pandas as pd
+import time
+
+import perf
 
 PROMPT_TEMPLATE = """你是一位数据分析助手，你的回应内容取决于用户的请求内容，请按照下面的步骤处理用户请求：
 1. 思考阶段 (Thought) ：先分析用户请求类型（文字回答/表格/图表），并验证数据类型是否匹配。
@@ -17,6 +24,9 @@ PROMPT_TEMPLATE = """你是一位数据分析助手，你的回应内容取决
 
    - 折线图
      {"line":{"columns": ["A", "B", "C", ...], "data": [35, 42, 29, ...]}}
+
+   - 多系列柱状图/折线图
+     {"line":{"columns": ["A", "B", "C", ...], "series": ["系列1", "系列2"], "data": [[35, 42, 29, ...], [20, 31, 18, ...]]}}
      
 3. 格式校验要求
    - 字符串值必须使用英文双引号
@@ -25,28 +35,152 @@ PROMPT_TEMPLATE = """你是一位数据分析助手，你的回应内容取决
    错误案例：{'columns':['Product', 'Sales'], data:[[A001, 200]]}
    正确案例：{"columns":["product", "sales"], "data":[["A001", 200]]}
 
-注意：响应数据的"output"中不要有换行符、制表符以及其他格式符号。
+注意：响应数据的"output"中不要有换行符、制表符以及其他格式符号。"""
+
+# 按预期输出类型预留的 max_tokens，输出被截断时提升到 table 档位重试一次
+MAX_TOKENS = {"answer": 256, "chart": 1024, "table": 4096}
+TABLE_KEYWORDS = ("表格", "明细", "列出", "清单", "排名", "table")
+CHART_KEYWORDS = ("图", "趋势", "分布", "占比", "对比", "chart", "plot")
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_max_tokens(query: str) -> int:
+    """根据请求类型预估输出长度"""
+    lowered = query.lower()
+    if any(word in lowered for word in TABLE_KEYWORDS):
+        return MAX_TOKENS["table"]
+    if any(word in lowered for word in CHART_KEYWORDS):
+        return MAX_TOKENS["chart"]
+    return MAX_TOKENS["answer"]
 
-当前用户请求如下：\n"""
 
-def dataframe_agent(df, query):
+@perf.timed("dataframe_agent")
+def dataframe_agent(df, query, history=None):
     load_dotenv()
     api_key = os.getenv("OPENAI_API_KEY")
     client = openai.OpenAI(api_key=api_key, base_url="https://api.openai-hk.com/v1")
-    prompt = PROMPT_TEMPLATE + query
+    # 固定的指令放在 system 消息中作为稳定前缀，便于服务端前缀缓存；多轮对话的上下文跟在其后
     messages = [
-        {"role": "system", "content": "你是一位数据分析助手。"},
-        {"role": "user", "content": prompt}
+        {"role": "system", "content": PROMPT_TEMPLATE},
+        *(history or []),
+        {"role": "user", "content": query}
     ]
+    max_tokens = estimate_max_tokens(query)
+    usage = {"prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0, "seconds": 0.0, "max_tokens": max_tokens}
     try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=messages,
-            temperature=0,
-            max_tokens=8192
-        )
-        content = response.choices[0].message.content
-        return json.loads(content)
+        while True:
+            start = time.perf_counter()
+            with perf.span("llm"):
+                response = client.chat.completions.create(
+                    model="gpt-3.5-turbo",
+                    messages=messages,
+                    temperature=0,
+                    max_tokens=max_tokens
+                )
+            _record_usage(response, time.perf_counter() - start, max_tokens, usage)
+            choice = response.choices[0]
+            if choice.finish_reason == "length" and max_tokens < MAX_TOKENS["table"]:
+                max_tokens = MAX_TOKENS["table"]
+                usage["max_tokens"] = max_tokens
+                continue
+            break
+        result = json.loads(choice.message.content)
+        if isinstance(result, dict):
+            result["usage"] = usage
+        return result
     except Exception as err:
         print(err)
         return {"answer": "暂时无法提供分析结果，请稍后重试！"}
+
+
+def _record_usage(response, seconds: float, max_tokens: int, usage: dict) -> None:
+    """累计单次调用的 token 用量与耗时，同时写入埋点和日志"""
+    prompt_tokens = completion_tokens = cached_tokens = 0
+    if response.usage is not None:
+        prompt_tokens = response.usage.prompt_tokens or 0
+        completion_tokens = response.usage.completion_tokens or 0
+        details = getattr(response.usage, "prompt_tokens_details", None)
+        cached_tokens = getattr(details, "cached_tokens", None) or 0
+    usage["prompt_tokens"] += prompt_tokens
+    usage["completion_tokens"] += completion_tokens
+    usage["cached_tokens"] += cached_tokens
+    usage["seconds"] = round(usage["seconds"] + seconds, 3)
+    perf.record_llm_usage(prompt_tokens, completion_tokens, cached_tokens, seconds, max_tokens)
+    logger.info(
+        "LLM 调用: prompt=%d completion=%d cached=%d max_tokens=%d 耗时=%.2fs",
+        prompt_tokens, completion_tokens, cached_tokens, max_tokens, seconds
+    )
+
+
+UPLOAD_TYPES = ("xlsx", "csv")
+
+
+def detect_file_type(filename: str) -> str:
+    """按扩展名判断文件类型"""
+    return "xlsx" if filename.lower().endswith((".xlsx", ".xls")) else "csv"
+
+
+def read_uploaded_file(data, file_type: str, sheet_name=None) -> pd.DataFrame:
+    """读取上传的 Excel/CSV 文件，CSV 依次尝试 utf-8、gbk、latin-1 编码"""
+    if file_type == "xlsx":
+        data.seek(0)
+        return pd.read_excel(data, sheet_name=sheet_name or 0)
+    for encoding in ("utf-8", "gbk"):
+        try:
+            data.seek(0)
+            return pd.read_csv(data, encoding=encoding)
+        except UnicodeDecodeError:
+            continue
+    data.seek(0)
+    return pd.read_csv(data, encoding="latin-1")
+
+
+def list_sheet_names(data) -> list:
+    """以只读模式读取工作表名称，避免为此完整解析整个工作簿"""
+    data.seek(0)
+    wb = openpyxl.load_workbook(data, read_only=True)
+    try:
+        return wb.sheetnames
+    finally:
+        wb.close()
+
+
+# 导出格式 -> (文件扩展名, MIME 类型)
+EXPORT_FORMATS = {
+    "CSV": ("csv", "text/csv"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+    "Excel": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+EXCEL_MAX_ROWS = 1048575
+PARQUET_ROW_GROUP = 100000
+
+
+def build_result_table(table: dict) -> pd.DataFrame:
+    """将智能体返回的表格转换为 DataFrame，混合类型的列转为字符串以便 Arrow 序列化"""
+    table_df = pd.DataFrame(table["data"], columns=table["columns"])
+    for col in table_df.columns[table_df.dtypes == object]:
+        if pd.api.types.infer_dtype(table_df[col], skipna=True).startswith("mixed"):
+            table_df[col] = table_df[col].astype(str)
+    return table_df
+
+
+def export_table(df: pd.DataFrame, fmt: str) -> bytes:
+    """按指定格式导出表格，Parquet 按行组、Excel 按行流式写入"""
+    buffer = io.BytesIO()
+    if fmt == "CSV":
+        df.to_csv(buffer, index=False, encoding="utf-8-sig")
+    elif fmt == "Parquet":
+        df.to_parquet(buffer, index=False, row_group_size=PARQUET_ROW_GROUP)
+    elif fmt == "Excel":
+        if len(df) > EXCEL_MAX_ROWS:
+            raise ValueError(f"Excel 最多支持 {EXCEL_MAX_ROWS:,} 行数据，请改用 CSV 或 Parquet 格式")
+        wb = openpyxl.Workbook(write_only=True)
+        ws = wb.create_sheet()
+        ws.append([str(col) for col in df.columns])
+        for row in df.itertuples(index=False, name=None):
+            ws.append([None if pd.isna(val) else val for val in row])
+        wb.save(buffer)
+    else:
+        raise ValueError(f"不支持的导出格式: {fmt}")
+    return buffer.getvalue()
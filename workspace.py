@@ -0,0 +1,175 @@
+import numpy as np
+import pandas as pd
+
+import perf
+from session_store import data_manager
+
+# 关联方式 -> 显示名称
+JOIN_HOW = {"left": "保留左表全部行", "inner": "仅保留匹配行"}
+_CODE_COLUMN = "_join_code"
+
+
+class Workspace:
+    """会话内的多数据集工作区
+
+    数据集、关联列的编码与关联结果都交给会话数据管理器保存（闲置时可落盘）。关联列的编码在数据集修改前只计算一次，
+    同一列被多次关联时共用一份编码；关联结果只计算一次，页面重跑和智能体查询直接复用。
+    """
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        # 名称 -> {"source": 来源标识, "version": 版本号, "generation": 加载代次, "deltas": 已追加的增量文件, "columns": 列名, "rows": 行数}
+        self.datasets = {}
+        # 名称 -> 关联定义及其构建时的输入版本
+        self.joins = {}
+        self.active = None
+        # 数据集 -> 已计算编码的关联列，数据保存在会话数据管理器中
+        self._code_columns = {}
+
+    @property
+    def names(self) -> list:
+        return list(self.datasets) + list(self.joins)
+
+    def columns(self, name: str) -> list:
+        meta = self.datasets.get(name) or self.joins[name]
+        return meta["columns"]
+
+    def load(self, name: str, source, loader) -> bool:
+        """按来源标识加载数据集，来源未变且数据仍在时不重复解析；返回是否重新加载"""
+        meta = self.datasets.get(name)
+        if meta is not None and meta["source"] == source and data_manager.contains(self.session_id, f"dataset:{name}"):
+            return False
+        self._store(name, loader(), source, [], reload=True)
+        return True
+
+    def update(self, name: str, df: "pd.DataFrame", delta_id=None) -> None:
+        """替换数据集内容（如追加增量数据），依赖它的关联会在下次访问时重新计算；delta_id 记录已追加的增量文件"""
+        if name not in self.datasets:
+            raise ValueError(f"关联数据集 {name} 不支持直接修改")
+        meta = self.datasets[name]
+        deltas = meta["deltas"] + ([delta_id] if delta_id is not None else [])
+        self._store(name, df, meta["source"], deltas, reload=False)
+
+    def applied_deltas(self, name: str) -> list:
+        """已追加到数据集的增量文件；数据从来源重新加载（包括缓存过期后）时清空"""
+        return list(self.datasets[name]["deltas"]) if name in self.datasets else []
+
+    def _store(self, name: str, df: "pd.DataFrame", source, deltas: list, reload: bool) -> None:
+        data_manager.put(self.session_id, f"dataset:{name}", df)
+        self._discard_codes(name)
+        previous = self.datasets.get(name)
+        version = previous["version"] + 1 if previous is not None else 0
+        # 从来源重新加载时开始新的代次，基于旧数据（含已追加增量）的统计量随之失效
+        generation = version if reload or previous is None else previous["generation"]
+        self.datasets[name] = {
+            "source": source,
+            "version": version,
+            "generation": generation,
+            "deltas": deltas,
+            "columns": list(df.columns),
+            "rows": len(df),
+        }
+
+    def retain(self, names: list) -> None:
+        """只保留指定的数据集，依赖已移除数据集的关联一并删除"""
+        for name in [name for name in self.datasets if name not in names]:
+            del self.datasets[name]
+            data_manager.discard(self.session_id, f"dataset:{name}")
+            self._discard_codes(name)
+        for name, spec in list(self.joins.items()):
+            if spec["left"] not in self.datasets or spec["right"] not in self.datasets:
+                del self.joins[name]
+                data_manager.discard(self.session_id, f"join:{name}")
+        if self.active not in self.names:
+            self.active = None
+
+    def contains(self, name: str) -> bool:
+        if name in self.joins:
+            spec = self.joins[name]
+            return self.contains(spec["left"]) and self.contains(spec["right"])
+        return name in self.datasets and data_manager.contains(self.session_id, f"dataset:{name}")
+
+    def get(self, name: str) -> "pd.DataFrame":
+        """读取数据集或关联结果，关联结果在输入未变化时直接复用"""
+        if name in self.datasets:
+            return data_manager.get(self.session_id, f"dataset:{name}")
+        spec = self.joins[name]
+        versions = self._input_versions(spec)
+        if spec["built"] != versions or not data_manager.contains(self.session_id, f"join:{name}"):
+            self._build_join(name, spec)
+        return data_manager.get(self.session_id, f"join:{name}")
+
+    def signature(self, name: str) -> tuple:
+        """数据内容的标识：原始数据集为来源和加载代次（追加数据不改变标识），关联还包含输入的版本"""
+        if name in self.datasets:
+            meta = self.datasets[name]
+            return ("dataset", name, meta["source"], meta["generation"])
+        spec = self.joins[name]
+        return ("join", name, spec["left_on"], spec["right_on"], spec["how"], self._input_versions(spec))
+
+    def summary(self) -> list:
+        rows = [{"数据集": name, "类型": "文件", "行数": meta["rows"], "列数": len(meta["columns"])} for name, meta in self.datasets.items()]
+        rows += [{"数据集": name, "类型": "关联", "行数": spec["rows"], "列数": len(spec["columns"])} for name, spec in self.joins.items()]
+        return rows
+
+    def key_codes(self, name: str, column: str) -> tuple:
+        """关联列的整数编码与唯一值，数据集修改前只计算一次"""
+        codes_key, uniques_key = f"codes:{name}:{column}", f"uniques:{name}:{column}"
+        if not (data_manager.contains(self.session_id, codes_key) and data_manager.contains(self.session_id, uniques_key)):
+            with perf.span("workspace.index"):
+                codes, uniques = pd.factorize(self.get(name)[column])
+            data_manager.put(self.session_id, codes_key, pd.DataFrame({"code": codes}))
+            data_manager.put(self.session_id, uniques_key, pd.DataFrame({"value": uniques}))
+            self._code_columns.setdefault(name, set()).add(column)
+        codes = data_manager.get(self.session_id, codes_key)["code"].to_numpy()
+        return codes, pd.Index(data_manager.get(self.session_id, uniques_key)["value"])
+
+    def _discard_codes(self, name: str) -> None:
+        for column in self._code_columns.pop(name, ()):
+            data_manager.discard(self.session_id, f"codes:{name}:{column}")
+            data_manager.discard(self.session_id, f"uniques:{name}:{column}")
+
+    def add_join(self, left: str, right: str, left_on: str, right_on: str, how: str = "left") -> str:
+        """定义并计算关联数据集，名称包含关联列和关联方式，不同定义互不覆盖；计算失败时不保留定义"""
+        if left not in self.datasets or right not in self.datasets:
+            raise ValueError("只能关联已上传的数据集")
+        if how not in JOIN_HOW:
+            raise ValueError(f"不支持的关联方式: {how}")
+        keys = str(left_on) if left_on == right_on else f"{left_on}={right_on}"
+        name = f"{left} ⋈ {right}（{keys}{'，仅匹配行' if how == 'inner' else ''}）"
+        spec = {"left": left, "right": right, "left_on": left_on, "right_on": right_on, "how": how, "built": None}
+        self._build_join(name, spec)
+        self.joins[name] = spec
+        return name
+
+    def _input_versions(self, spec: dict) -> tuple:
+        return (self.datasets[spec["left"]]["version"], self.datasets[spec["right"]]["version"])
+
+    def _build_join(self, name: str, spec: dict) -> None:
+        with perf.span("workspace.join"):
+            joined = self._merge(spec)
+            data_manager.put(self.session_id, f"join:{name}", joined)
+        spec.update(built=self._input_versions(spec), columns=list(joined.columns), rows=len(joined))
+
+    def _merge(self, spec: dict) -> "pd.DataFrame":
+        left = self.get(spec["left"])
+        right = self.get(spec["right"])
+        right_codes, uniques = self.key_codes(spec["right"], spec["right_on"])
+        # 左表的关联键按右表的唯一值编码，两侧使用同一套整数编码比较
+        left_codes = uniques.get_indexer(left[spec["left_on"]])
+
+        right_part = right.drop(columns=[spec["right_on"]]) if spec["left_on"] == spec["right_on"] else right
+        right_part = right_part.rename(columns={col: f"{col}_{spec['right']}" for col in right_part.columns if col in left.columns})
+        if spec["how"] == "inner":
+            matched = left_codes >= 0
+            left = left[matched]
+            left_codes = left_codes[matched]
+
+        if len(uniques) == len(right):
+            # 右表关联键唯一（如产品表）：编码即行号，直接按行号取值，未匹配的编码 -1 得到空值
+            looked_up = right_part.reset_index(drop=True).reindex(left_codes).reset_index(drop=True)
+            return pd.concat([left.reset_index(drop=True), looked_up], axis=1)
+        # 一对多关联：在整数编码上合并，右表空值（编码 -1）不参与匹配
+        right_part = right_part.assign(**{_CODE_COLUMN: np.where(right_codes < 0, -2, right_codes)})
+        merged = left.assign(**{_CODE_COLUMN: left_codes}).merge(right_part, on=_CODE_COLUMN, how=spec["how"])
+        return merged.drop(columns=[_CODE_COLUMN])